@@ -0,0 +1,438 @@
+"""Admin views: dashboard, doctors, patients, appointments, analytics and exports."""
+from datetime import timedelta, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, abort, \
+    stream_with_context
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+
+from models import db, Doctor, Patient, Appointment, Department
+from auth_views import login_required
+from cache import cache
+from dashboard_stats import get_counters
+from database import replica_reads
+from fragments import caches_fragments
+from metrics import render_metrics
+from pagination import keyset_page
+import bulk_actions
+import export
+import rollups
+import search
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+@bp.route('/dashboard')
+@login_required(role='admin')
+@replica_reads
+@caches_fragments
+def admin_dashboard():
+    counters = get_counters()
+    total_doctors = counters['active_doctors']
+    total_patients = counters['active_patients']
+    total_appointments = counters['appointments']
+    
+    # Upcoming appointments
+    today = date.today()
+    appointment_page = keyset_page(
+        Appointment.query.options(
+            joinedload(Appointment.doctor),
+            joinedload(Appointment.patient)
+        ).filter(
+            Appointment.date >= today,
+            Appointment.status == 'Booked'
+        ),
+        [Appointment.date, Appointment.time, Appointment.id],
+        prefix='appt_'
+    )
+    
+    # Registered patients
+    patient_page = keyset_page(Patient.query.filter_by(is_active=True), [Patient.id], prefix='patient_')
+    
+    doctor_page = keyset_page(Doctor.query.filter_by(is_active=True), [Doctor.id], prefix='doctor_')
+    
+    return render_template(
+        'admin_dashboard.html',
+        total_doctors=total_doctors,
+        total_patients=total_patients,
+        total_appointments=total_appointments,
+        upcoming_appointments=appointment_page.items,
+        patients=patient_page.items,
+        doctors=doctor_page.items,
+        appointment_page=appointment_page,
+        patient_page=patient_page,
+        doctor_page=doctor_page,
+        search_type=None,
+        search_query=''
+    )
+
+
+@bp.route('/add_doctor', methods=['GET', 'POST'])
+@login_required(role='admin')
+def add_doctor():
+    departments = Department.query.all()
+    
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+        specialization = request.form.get('specialization')
+        department_id = request.form.get('department_id')
+        experience = request.form.get('experience')
+        
+        # Check if username or email already exists
+        existing_doctor = Doctor.query.filter(
+            or_(Doctor.username == username, Doctor.email == email)
+        ).first()
+        
+        if existing_doctor:
+            flash('Username or email already exists', 'danger')
+            return redirect(url_for('admin.add_doctor'))
+        
+        exp_val = int(experience) if experience else 0
+        if exp_val < 0:
+            flash('Experience cannot be negative.', 'danger')
+            return redirect(url_for('admin.add_doctor'))
+        
+        doctor = Doctor(
+            username=username,
+            name=name,
+            email=email,
+            phone=phone,
+            specialization=specialization,
+            department_id=int(department_id),
+            experience=exp_val
+        )
+        doctor.set_password(password)
+        
+        db.session.add(doctor)
+        db.session.commit()
+        
+        flash('Doctor added successfully', 'success')
+        return redirect(url_for('admin.admin_dashboard'))
+    
+    departments = Department.query.all()
+    return render_template('add_doctor.html', departments=departments)
+
+@bp.route('/update_doctor/<int:doctor_id>', methods=['GET', 'POST'])
+@login_required(role='admin')
+def update_doctor(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+    departments = Department.query.all()
+    
+    if request.method == 'POST':
+        doctor.name = request.form.get('name')
+        doctor.email = request.form.get('email')
+        doctor.phone = request.form.get('phone')
+        doctor.specialization = request.form.get('specialization')
+        doctor.department_id = int(request.form.get('department_id'))
+        doctor.experience = int(request.form.get('experience')) if request.form.get('experience') else None
+        
+        db.session.commit()
+        flash('Doctor updated successfully', 'success')
+        return redirect(url_for('admin.admin_dashboard'))
+    
+    return render_template('update_doctor.html', doctor=doctor, departments=departments)
+
+@bp.route('/remove_doctor/<int:doctor_id>')
+@login_required(role='admin')
+def remove_doctor(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor.is_active = False
+    db.session.commit()
+    flash('Doctor removed successfully', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/remove_patient/<int:patient_id>')
+@login_required(role='admin')
+def remove_patient(patient_id):
+    patient = Patient.query.get_or_404(patient_id)
+    patient.is_active = False
+    db.session.commit()
+    flash('Patient removed successfully', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/view_appointments')
+@login_required(role='admin')
+@replica_reads
+def view_appointments():
+    page = keyset_page(
+        Appointment.query.options(
+            joinedload(Appointment.doctor),
+            joinedload(Appointment.patient)
+        ),
+        [Appointment.date, Appointment.time, Appointment.id],
+        descending=True
+    )
+    return render_template('view_appointments.html', appointments=page.items, page=page)
+
+@bp.route('/analytics')
+@login_required(role='admin')
+@replica_reads
+def admin_analytics():
+    # ?days=N: the N days up to and including today, read from the rollups
+    days = max(1, min(request.args.get('days', 30, type=int), 365))
+    # Imported here so that only processes serving this page load NumPy
+    import analytics
+
+    end = date.today()
+    rollups.catch_up()
+    report = analytics.report(end - timedelta(days=days - 1), end)
+    return render_template('admin_analytics.html', report=report, days=days)
+
+@bp.route('/export')
+@login_required(role='admin')
+@replica_reads
+def export_appointments():
+    # ?format=csv|ndjson&start=YYYY-MM-DD&end=YYYY-MM-DD&status=...&gzip=1
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        abort(400)
+    try:
+        start = export.parse_date(request.args.get('start'))
+        end = export.parse_date(request.args.get('end'))
+    except ValueError:
+        abort(400)
+    statuses = request.args.getlist('status')
+    compress = request.args.get('gzip') == '1'
+
+    filename = f'appointments.{fmt}' + ('.gz' if compress else '')
+    # The generator runs after the view returns, so keep the app context alive
+    chunks = stream_with_context(export.export_chunks(fmt, start, end, statuses, compress))
+    return Response(chunks, mimetype='application/gzip' if compress else export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/appointment/<int:appointment_id>/complete', methods=['GET', 'POST'])
+@login_required(role='admin')
+def admin_complete_appointment(appointment_id):
+    appt = Appointment.query.get_or_404(appointment_id)
+    appt.status = 'Completed'
+    db.session.commit()
+    return redirect(url_for('admin.view_appointments'))
+
+
+@bp.route('/appointment/<int:appointment_id>/cancel', methods=['GET', 'POST'])
+@login_required(role='admin')
+def admin_cancel_appointment(appointment_id):
+    appt = Appointment.query.get_or_404(appointment_id)
+    appt.status = 'Cancelled'
+    db.session.commit()
+    return redirect(url_for('admin.view_appointments'))
+
+
+def action_data():
+    # Form posts from the admin pages, or a JSON object
+    if not request.is_json:
+        return request.form
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400)
+    return data
+
+
+def bulk_params():
+    # {"action": ..., "ids": [...]}; JSON ids must be integers (not strings or booleans)
+    data = action_data()
+    if request.is_json:
+        ids = data.get('ids', [])
+        if not isinstance(ids, list) or any(type(i) is not int for i in ids):
+            abort(400)
+    else:
+        try:
+            ids = [int(i) for i in data.getlist('ids')]
+        except ValueError:
+            abort(400)
+    ids = sorted(set(ids))
+    if len(ids) > bulk_actions.MAX_IDS:
+        abort(400)
+    return data, ids
+
+
+def bulk_done(updated, message, endpoint, **values):
+    if request.is_json:
+        return jsonify(updated=updated)
+    flash(message.format(updated), 'success')
+    return redirect(url_for(endpoint, **values))
+
+
+@bp.route('/appointments/bulk', methods=['POST'])
+@login_required(role='admin')
+def admin_bulk_appointments():
+    data, ids = bulk_params()
+    status = {'complete': 'Completed', 'cancel': 'Cancelled'}.get(data.get('action'))
+    if status is None:
+        abort(400)
+    updated = bulk_actions.set_appointment_status(ids, status) if ids else 0
+    db.session.commit()
+    return bulk_done(updated, '{} appointment(s) marked ' + status, 'admin.view_appointments')
+
+
+@bp.route('/doctor/<int:doctor_id>/cancel_appointments', methods=['POST'])
+@login_required(role='admin')
+def admin_cancel_doctor_appointments(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+    data = action_data()
+    try:
+        start = export.parse_date(data.get('start'))
+        end = export.parse_date(data.get('end'))
+    except (TypeError, ValueError):
+        abort(400)
+    if start is None or end is None or start > end:
+        abort(400)
+    updated = bulk_actions.cancel_doctor_appointments(doctor.id, start, end)
+    db.session.commit()
+    return bulk_done(updated, f'{{}} booked appointment(s) of {doctor.name} cancelled', 'admin.edit_doctor',
+                     doctor_id=doctor.id)
+
+
+def bulk_set_active(model):
+    data, ids = bulk_params()
+    active = {'activate': True, 'deactivate': False}.get(data.get('action'))
+    if active is None:
+        abort(400)
+    updated = bulk_actions.set_active(model, ids, active) if ids else 0
+    db.session.commit()
+    verb = 'activated' if active else 'deactivated'
+    return bulk_done(updated, f'{{}} {model.__name__.lower()}(s) {verb}', 'admin.admin_dashboard')
+
+
+@bp.route('/doctors/bulk', methods=['POST'])
+@login_required(role='admin')
+def admin_bulk_doctors():
+    return bulk_set_active(Doctor)
+
+
+@bp.route('/patients/bulk', methods=['POST'])
+@login_required(role='admin')
+def admin_bulk_patients():
+    return bulk_set_active(Patient)
+
+
+@bp.route('/search', methods=['GET', 'POST'])
+@login_required(role='admin')
+@replica_reads
+@caches_fragments
+def admin_search():
+    search_query = ''
+    search_type = 'doctor'
+
+    doctors = []
+    patients = []
+    upcoming_appointments = []
+
+    if request.method == 'POST':
+        search_query = request.form.get('search_query', '').strip()
+        search_type = request.form.get('search_type', 'doctor')
+
+        if search_type == 'doctor':
+            # Find doctors by name or specialization
+            doctors = search.search_doctors(search_query).all()
+
+            # Upcoming appointments for these doctors
+            if doctors:
+                doctor_ids = [d.id for d in doctors]
+                upcoming_appointments = Appointment.query.options(
+                    joinedload(Appointment.doctor),
+                    joinedload(Appointment.patient)
+                ).filter(
+                    Appointment.doctor_id.in_(doctor_ids),
+                    Appointment.date >= date.today(),
+                    Appointment.status == 'Booked'
+                ).order_by(Appointment.date, Appointment.time).all()
+
+
+        elif search_type == 'patient':
+            # Find patients by name or email
+            patients = search.search_patients(search_query).all()
+
+            # Upcoming appointments for these patients
+            if patients:
+                patient_ids = [p.id for p in patients]
+                upcoming_appointments = Appointment.query.options(
+                    joinedload(Appointment.doctor),
+                    joinedload(Appointment.patient)
+                ).filter(
+                    Appointment.patient_id.in_(patient_ids),
+                    Appointment.date >= date.today(),
+                    Appointment.status == 'Booked'
+                ).order_by(Appointment.date, Appointment.time).all()
+
+
+    # Render same admin dashboard template but with search results
+    return render_template(
+        'admin_dashboard.html',
+        search_query=search_query,
+        search_type=search_type,
+        doctors_search_results=doctors,
+        patients_search_results=patients,
+        search_appointments=upcoming_appointments
+    )
+
+@bp.route('/doctor/<int:doctor_id>/toggle', methods=['GET', 'POST'])
+@login_required(role='admin')
+def toggle_doctor_status(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor.is_active = not doctor.is_active
+    db.session.commit()
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/doctor/<int:doctor_id>/edit', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_doctor(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+
+    if request.method == 'POST':
+        doctor.name = request.form.get('name').strip()
+        doctor.email = request.form.get('email').strip()
+        doctor.phone = request.form.get('phone').strip()
+        doctor.specialization = request.form.get('specialization').strip()
+        # add other fields if your Doctor model has them
+
+        db.session.commit()
+        return redirect(url_for('admin.admin_dashboard'))
+
+    return render_template('edit_doctor.html', doctor=doctor)
+
+
+@bp.route('/patient/<int:patient_id>/toggle', methods=['GET', 'POST'])
+@login_required(role='admin')
+def toggle_patient_status(patient_id):
+    patient = Patient.query.get_or_404(patient_id)
+    patient.is_active = not patient.is_active
+    db.session.commit()
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/patient/<int:patient_id>/edit', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_patient(patient_id):
+    patient = Patient.query.get_or_404(patient_id)
+
+    if request.method == 'POST':
+        patient.name = request.form.get('name').strip()
+        patient.email = request.form.get('email').strip()
+        patient.phone = request.form.get('phone').strip()
+        # add other fields if your Patient model has them (age, address, etc.)
+
+        db.session.commit()
+        return redirect(url_for('admin.admin_dashboard'))
+
+    return render_template('edit_patient.html', patient=patient)
+
+@bp.route('/patient/<int:patient_id>/blacklist', methods=['GET', 'POST'])
+@login_required(role='admin')
+def toggle_patient_blacklist(patient_id):
+    patient = Patient.query.get_or_404(patient_id)
+    patient.is_blacklisted = not patient.is_blacklisted
+    db.session.commit()
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/cache_stats')
+@login_required(role='admin')
+def cache_stats():
+    return jsonify(cache.stats())
+
+@bp.route('/metrics')
+@login_required(role='admin')
+def admin_metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,116 @@
+"""Utilization report for the admin analytics page, read from the rollups.
+
+report() reads only doctor_day_stats (see rollups.py): SQL sums it per day,
+department and doctor, and NumPy turns those into rates, moving averages
+and trends. Only the analytics view imports this module, so processes that
+never render it do not load NumPy.
+"""
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import db, Doctor, Department
+from rollups import stats
+
+MOVING_AVERAGE_DAYS = 7
+# Columns of the summed rollup rows; the first four are appointment counts
+BOOKED, COMPLETED, CANCELLED, EXPIRED, BOOKED_MINUTES, AVAILABLE_MINUTES = range(6)
+COUNTS = slice(BOOKED, EXPIRED + 1)
+
+
+def _moving_average(values, window=MOVING_AVERAGE_DAYS):
+    # Trailing average; the first days average over what is available
+    sums = np.cumsum(values, dtype=float)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator > 0)
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _slope(values):
+    # Least-squares change per day; needs two days to mean anything
+    if values.shape[0] < 2:
+        return np.zeros(values.shape[1:]) if values.ndim > 1 else 0.0
+    return np.polyfit(np.arange(values.shape[0]), values, 1)[0]
+
+
+def _counts(values):
+    return {'booked': int(values[BOOKED]), 'completed': int(values[COMPLETED]),
+            'cancelled': int(values[CANCELLED]), 'expired': int(values[EXPIRED])}
+
+
+def report(start, end, top=10):
+    columns = (func.sum(stats.c.booked), func.sum(stats.c.completed), func.sum(stats.c.cancelled),
+               func.sum(stats.c.expired), func.sum(stats.c.booked_minutes), func.sum(stats.c.available_minutes))
+    in_range = stats.c.date.between(start, end)
+    days = (end - start).days + 1
+    dates = [start + timedelta(days=i) for i in range(days)]
+
+    departments = Department.query.order_by(Department.name).all()
+    dept_index = {d.id: i for i, d in enumerate(departments)}
+    # days x departments x (booked, completed, cancelled, expired, booked min, available min)
+    grid = np.zeros((days, len(departments), len(columns)))
+    for day, department_id, *values in db.session.execute(
+        select(stats.c.date, Doctor.department_id, *columns)
+        .join(Doctor, Doctor.id == stats.c.doctor_id).where(in_range)
+        .group_by(stats.c.date, Doctor.department_id)
+    ):
+        if department_id in dept_index:
+            grid[(day - start).days, dept_index[department_id]] = values
+
+    daily = grid.sum(axis=1)
+    appointments = daily[:, COUNTS].sum(axis=1)
+    utilization = _ratio(daily[:, BOOKED_MINUTES], daily[:, AVAILABLE_MINUTES])
+    utilization_avg = _ratio(_moving_average(daily[:, BOOKED_MINUTES]), _moving_average(daily[:, AVAILABLE_MINUTES]))
+    appointments_avg = _moving_average(appointments)
+    by_dept = grid.sum(axis=0)
+    dept_appointments = grid[:, :, COUNTS].sum(axis=2)
+
+    doctor_rows = db.session.execute(
+        select(stats.c.doctor_id, *columns).where(in_range).group_by(stats.c.doctor_id)
+    ).all()
+    doctor_values = np.array([r[1:] for r in doctor_rows], dtype=float).reshape(-1, len(columns))
+    doctor_util = _ratio(doctor_values[:, BOOKED_MINUTES], doctor_values[:, AVAILABLE_MINUTES])
+    order = np.argsort(np.nan_to_num(-doctor_util, nan=np.inf), kind='stable')[:top]
+    doctors = {d.id: d for d in Doctor.query.filter(Doctor.id.in_([doctor_rows[i][0] for i in order]))}
+
+    totals = daily.sum(axis=0)
+    return {
+        'start': start,
+        'end': end,
+        'totals': {
+            **_counts(totals),
+            'booked_minutes': int(totals[BOOKED_MINUTES]), 'available_minutes': int(totals[AVAILABLE_MINUTES]),
+            'utilization': _number(_ratio(totals[BOOKED_MINUTES:BOOKED_MINUTES + 1],
+                                          totals[AVAILABLE_MINUTES:AVAILABLE_MINUTES + 1])[0]),
+            'cancellation_rate': _number(_ratio(totals[CANCELLED:CANCELLED + 1], appointments.sum(keepdims=True))[0]),
+            'trend_per_week': float(_slope(appointments) * 7),
+        },
+        'days': [
+            {'date': d, **_counts(daily[i]), 'utilization': _number(utilization[i]),
+             'utilization_avg': _number(utilization_avg[i]), 'appointments_avg': float(appointments_avg[i])}
+            for i, d in enumerate(dates)
+        ],
+        'departments': [
+            {'name': dept.name, **_counts(by_dept[i]),
+             'utilization': _number(_ratio(by_dept[i, BOOKED_MINUTES:BOOKED_MINUTES + 1],
+                                           by_dept[i, AVAILABLE_MINUTES:AVAILABLE_MINUTES + 1])[0]),
+             'trend_per_week': float(trend * 7)}
+            for i, (dept, trend) in enumerate(zip(departments, np.atleast_1d(_slope(dept_appointments))))
+        ],
+        'top_doctors': [
+            {'doctor': doctors.get(doctor_rows[i][0]), 'appointments': int(doctor_values[i, COUNTS].sum()),
+             'utilization': _number(doctor_util[i])}
+            for i in order if doctor_rows[i][0] in doctors
+        ],
+    }
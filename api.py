@@ -0,0 +1,309 @@
+"""Async JSON API for doctors, availability and appointments.
+
+A plain ASGI application, served separately from the Flask app:
+
+    uvicorn api:application --workers 2
+
+Queries run on async SQLAlchemy (aiosqlite for SQLite), so a slow or
+long-polling client holds a coroutine rather than a worker thread. It uses
+the same database (DATABASE_URL), the same models and the same login: the
+Flask session cookie set by /login is verified with the app's SECRET_KEY,
+the account must still exist and be active (401 / 403 otherwise), and
+appointment access goes through Appointment.is_owned_by, as in the HTML
+views.
+
+    GET  /api/doctors                          ?department_id= &specialization=
+    GET  /api/doctors/<id>/availability        next 7 days
+    GET  /api/appointments                     own appointments; ?status= &after_id= &limit=
+    GET  /api/appointments/<id>
+    POST /api/appointments/<id>/cancel         patient or doctor of the appointment
+    POST /api/appointments/<id>/status         doctor only; body {"status": "Completed"}
+"""
+import json
+import logging
+import re
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload
+
+from app import create_app
+from identity import MODELS
+from models import db, Doctor, Appointment, DoctorAvailability, SQLITE_BUSY_TIMEOUT_MS
+
+# Only for its config, session signing and database URL
+app = create_app({'BLUEPRINTS': []})
+
+log = logging.getLogger('api')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg', 'mysql': 'mysql+aiomysql'}
+
+
+def async_url():
+    # Resolve the URL through Flask-SQLAlchemy so relative SQLite paths point
+    # at the same file as the app (instance/hospital.db)
+    with app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def make_engine():
+    url = async_url()
+    connect_args = {}
+    if url.get_backend_name() == 'sqlite':
+        # aiosqlite does not go through the sqlite3 pragma listener in models.py;
+        # WAL is a property of the database file, so only the timeout is needed
+        connect_args['timeout'] = SQLITE_BUSY_TIMEOUT_MS / 1000
+    return create_async_engine(url, connect_args=connect_args)
+
+
+engine = make_engine()
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def current_user(headers):
+    # Same signed cookie that Flask's session interface writes
+    cookie = SimpleCookie(headers.get('cookie', ''))
+    morsel = cookie.get(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if morsel is None:
+        raise HTTPError(401, 'Please login first')
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        data = serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        raise HTTPError(401, 'Please login first')
+    if 'user_id' not in data or 'role' not in data:
+        raise HTTPError(401, 'Please login first')
+    return data['role'], data['user_id']
+
+
+async def check_account(session, user):
+    # A valid cookie outlives the account: look it up on every request, as
+    # login_required does for the HTML views
+    role, user_id = user
+    model = MODELS.get(role)
+    account = await session.get(model, user_id) if model is not None else None
+    if account is None:
+        raise HTTPError(401, 'Please login first')
+    if getattr(account, 'is_active', True) is False:
+        raise HTTPError(403, 'Your account has been deactivated')
+
+
+def int_param(query, name, default=None):
+    value = query.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f'{name} must be an integer')
+
+
+def doctor_json(doctor):
+    return {'id': doctor.id, 'name': doctor.name, 'specialization': doctor.specialization,
+            'department_id': doctor.department_id,
+            'department': doctor.department.name if doctor.department else None,
+            'experience': doctor.experience}
+
+
+def availability_json(availability):
+    return {'id': availability.id, 'doctor_id': availability.doctor_id,
+            'date': availability.date.isoformat(),
+            'start_time': availability.start_time.strftime('%H:%M'),
+            'end_time': availability.end_time.strftime('%H:%M'),
+            'is_available': availability.is_available}
+
+
+def appointment_json(appointment):
+    return {'id': appointment.id, 'date': appointment.date.isoformat(),
+            'time': appointment.time.strftime('%H:%M'), 'status': appointment.status,
+            'reason': appointment.reason,
+            'doctor': {'id': appointment.doctor_id, 'name': appointment.doctor.name},
+            'patient': {'id': appointment.patient_id, 'name': appointment.patient.name}}
+
+
+async def list_doctors(session, user, query):
+    stmt = select(Doctor).options(joinedload(Doctor.department)).where(Doctor.is_active == True)
+    department_id = int_param(query, 'department_id')
+    if department_id is not None:
+        stmt = stmt.where(Doctor.department_id == department_id)
+    if query.get('specialization'):
+        stmt = stmt.where(Doctor.specialization == query['specialization'])
+    doctors = (await session.scalars(stmt.order_by(Doctor.name, Doctor.id))).all()
+    return {'doctors': [doctor_json(d) for d in doctors]}
+
+
+async def doctor_availability(session, user, query, doctor_id):
+    doctor = await session.get(Doctor, doctor_id)
+    if doctor is None or not doctor.is_active:
+        raise HTTPError(404, 'Doctor not found')
+    today = date.today()
+    availability = (await session.scalars(
+        select(DoctorAvailability).where(
+            DoctorAvailability.doctor_id == doctor_id,
+            DoctorAvailability.date >= today,
+            DoctorAvailability.date <= today + timedelta(days=7),
+            DoctorAvailability.is_available == True,
+        ).order_by(DoctorAvailability.date, DoctorAvailability.start_time)
+    )).all()
+    return {'doctor_id': doctor_id, 'availability': [availability_json(a) for a in availability]}
+
+
+def appointment_query():
+    return select(Appointment).options(joinedload(Appointment.doctor), joinedload(Appointment.patient))
+
+
+async def list_appointments(session, user, query):
+    role, user_id = user
+    stmt = appointment_query()
+    if role == 'doctor':
+        stmt = stmt.where(Appointment.doctor_id == user_id)
+    elif role == 'patient':
+        stmt = stmt.where(Appointment.patient_id == user_id)
+    if query.get('status'):
+        stmt = stmt.where(Appointment.status == query['status'])
+    # Newest first; after_id is the last id of the previous page
+    after_id = int_param(query, 'after_id')
+    if after_id is not None:
+        stmt = stmt.where(Appointment.id < after_id)
+    limit = max(1, min(int_param(query, 'limit', DEFAULT_LIMIT), MAX_LIMIT))
+    appointments = (await session.scalars(stmt.order_by(Appointment.id.desc()).limit(limit))).all()
+    return {'appointments': [appointment_json(a) for a in appointments],
+            'next_after_id': appointments[-1].id if len(appointments) == limit else None}
+
+
+async def owned_appointment(session, user, appointment_id):
+    appointment = (await session.scalars(
+        appointment_query().where(Appointment.id == appointment_id))).first()
+    if appointment is None:
+        raise HTTPError(404, 'Appointment not found')
+    if not appointment.is_owned_by(*user):
+        raise HTTPError(403, 'Unauthorized access')
+    return appointment
+
+
+async def get_appointment(session, user, query, appointment_id):
+    return appointment_json(await owned_appointment(session, user, appointment_id))
+
+
+async def cancel_appointment(session, user, query, appointment_id, body=None):
+    if user[0] not in ('doctor', 'patient'):
+        raise HTTPError(403, 'Unauthorized access')
+    appointment = await owned_appointment(session, user, appointment_id)
+    if appointment.status != 'Booked':
+        raise HTTPError(409, 'Only booked appointments can be cancelled')
+    appointment.status = 'Cancelled'
+    await session.commit()
+    return appointment_json(appointment)
+
+
+async def mark_appointment(session, user, query, appointment_id, body=None):
+    if user[0] != 'doctor':
+        raise HTTPError(403, 'Unauthorized access')
+    status = body.get('status')
+    if status not in Appointment.MARKABLE_STATUSES:
+        raise HTTPError(400, f'status must be one of {", ".join(Appointment.MARKABLE_STATUSES)}')
+    appointment = await owned_appointment(session, user, appointment_id)
+    appointment.status = status
+    await session.commit()
+    return appointment_json(appointment)
+
+
+# (method, path pattern, handler); path groups are passed as int arguments
+ROUTES = [
+    ('GET', r'/api/doctors', list_doctors),
+    ('GET', r'/api/doctors/(\d+)/availability', doctor_availability),
+    ('GET', r'/api/appointments', list_appointments),
+    ('GET', r'/api/appointments/(\d+)', get_appointment),
+    ('POST', r'/api/appointments/(\d+)/cancel', cancel_appointment),
+    ('POST', r'/api/appointments/(\d+)/status', mark_appointment),
+]
+ROUTES = [(method, re.compile(pattern + '/?$'), handler) for method, pattern, handler in ROUTES]
+
+
+def match(method, path):
+    allowed = False
+    for route_method, pattern, handler in ROUTES:
+        found = pattern.match(path)
+        if found:
+            if route_method == method:
+                return handler, [int(arg) for arg in found.groups()]
+            allowed = True
+    raise HTTPError(405 if allowed else 404, 'Method not allowed' if allowed else 'Not found')
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def handle(scope, receive):
+    method = scope['method']
+    handler, args = match(method, scope['path'])
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+    user = current_user(headers)
+    query = dict(parse_qsl(scope.get('query_string', b'').decode()))
+    if method == 'POST':
+        raw = await read_body(receive)
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            raise HTTPError(400, 'Body must be JSON')
+        if not isinstance(body, dict):
+            raise HTTPError(400, 'Body must be a JSON object')
+        args.append(body)
+    async with Session() as session:
+        await check_account(session, user)
+        return await handler(session, user, query, *args)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    try:
+        payload = await handle(scope, receive)
+    except HTTPError as e:
+        return await send_json(send, e.status, {'error': e.message})
+    except Exception:
+        log.exception('%s %s failed', scope['method'], scope['path'])
+        return await send_json(send, 500, {'error': 'Internal server error'})
+    await send_json(send, 200, payload)
@@ -0,0 +1,109 @@
+"""Move finished appointments out of the hot appointment table.
+
+Completed, Cancelled and Expired appointments older than --days (default
+365) are copied, with their treatments, into appointment_archive/
+treatment_archive and deleted from appointment/treatment. The work is done in chunks of
+--chunk-size appointment ids, one transaction per chunk, so the job can be
+stopped at any point and simply run again.
+
+The history views read both tiers through read_both(); everything that
+looks at Booked appointments only ever needs the hot table.
+
+Usage: python archive.py [--days 365] [--chunk-size 5000]
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import DateTime, and_, delete, func, literal, select
+
+from models import db, Appointment, Treatment, ArchivedAppointment, ArchivedTreatment
+
+FINISHED_STATUSES = ('Completed', 'Cancelled', 'Expired')
+
+
+def read_both(build, limit=None):
+    # build(model) returns the query for one tier; rows come back newest first
+    rows = []
+    for model in (Appointment, ArchivedAppointment):
+        query = build(model).order_by(model.date.desc(), model.time.desc())
+        rows.extend((query.limit(limit) if limit else query).all())
+    rows.sort(key=lambda a: (a.date, a.time), reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def _move_chunk(connection, first_id, last_id, cutoff):
+    appointment = Appointment.__table__
+    treatment = Treatment.__table__
+    archived = ArchivedAppointment.__table__
+    archived_treatment = ArchivedTreatment.__table__
+
+    # A primary key range keeps every statement on the rowid index
+    movable = and_(
+        appointment.c.id.between(first_id, last_id),
+        appointment.c.status.in_(FINISHED_STATUSES),
+        appointment.c.date < cutoff,
+    )
+    moving_ids = select(appointment.c.id).where(movable)
+
+    columns = ['id', 'patient_id', 'doctor_id', 'date', 'time', 'status', 'reason', 'created_at']
+    moved = connection.execute(archived.insert().from_select(
+        columns + ['archived_at'],
+        select(*[appointment.c[c] for c in columns], literal(datetime.utcnow(), DateTime)).where(movable)
+    )).rowcount
+    if not moved:
+        return 0
+
+    columns = ['id', 'appointment_id', 'diagnosis', 'prescription', 'notes', 'created_at']
+    connection.execute(archived_treatment.insert().from_select(
+        columns, select(*[treatment.c[c] for c in columns]).where(treatment.c.appointment_id.in_(moving_ids))
+    ))
+    connection.execute(delete(treatment).where(treatment.c.appointment_id.in_(moving_ids)))
+    connection.execute(delete(appointment).where(movable))
+    return moved
+
+
+def archive_appointments(days=365, chunk_size=5000, verbose=True):
+    cutoff = date.today() - timedelta(days=days)
+    # Core statements on the session's connection: the slot grid, caches
+    # and dashboard counters are unaffected (only finished rows move, and
+    # the appointments counter covers both tiers)
+    low, high = db.session.query(func.min(Appointment.id), func.max(Appointment.id)).one()
+    db.session.commit()
+    total = 0
+    started = time.perf_counter()
+    if low is None:
+        return 0
+    # The row with the highest id always stays: SQLite hands out max(id) + 1
+    # to new rows, so removing it could reuse an id that is already archived
+    for first_id in range(low, high, chunk_size):
+        last_id = min(first_id + chunk_size, high) - 1
+        chunk_start = time.perf_counter()
+        moved = _move_chunk(db.session.connection(), first_id, last_id, cutoff)
+        db.session.commit()
+        total += moved
+        if verbose and moved:
+            elapsed = time.perf_counter() - chunk_start
+            print(f'ids {first_id}-{last_id}: {moved} archived ({moved / elapsed:.0f} rows/s)')
+    if verbose:
+        elapsed = time.perf_counter() - started
+        print(f'Archived {total} appointments finished before {cutoff} in {elapsed:.1f}s')
+    return total
+
+
+def main():
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    parser = argparse.ArgumentParser(description='Archive finished appointments.')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        archive_appointments(args.days, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Login, registration and logout, and the login_required decorator.
+
+Always registered by create_app(); the role blueprints use login_required.
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, g
+from sqlalchemy import or_
+
+from models import db, Admin, Doctor, Patient
+from passwords import needs_rehash
+
+bp = Blueprint('auth', __name__)
+
+
+# Helper function to check authentication
+def login_required(role=None):
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            principal = g.get('principal')
+            if principal is None:
+                flash('Please login first', 'danger')
+                return redirect(url_for('auth.login'))
+            if role and principal.role != role:
+                flash('Unauthorized access', 'danger')
+                return redirect(url_for('auth.login'))
+            if not principal.is_active:
+                session.clear()
+                flash('Your account has been deactivated', 'danger')
+                return redirect(url_for('auth.login'))
+            return f(*args, **kwargs)
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+@bp.route('/')
+def index():
+    return redirect(url_for('auth.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        role = request.form.get('role')
+        
+        user = None
+        if role == 'admin':
+            user = Admin.query.filter_by(username=username).first()
+        elif role == 'doctor':
+            user = Doctor.query.filter_by(username=username).first()
+        elif role == 'patient':
+            user = Patient.query.filter_by(username=username).first()
+        
+        if user and user.check_password(password):
+            if role in ['doctor', 'patient'] and not user.is_active:
+                flash('Your account has been deactivated', 'danger')
+                return redirect(url_for('auth.login'))
+            
+            # Upgrade hashes made with older hashing parameters
+            if needs_rehash(user.password_hash):
+                user.set_password(password)
+                db.session.commit()
+            
+            session['user_id'] = user.id
+            session['role'] = role
+            session['username'] = user.username
+            
+            if role == 'admin':
+                return redirect(url_for('admin.admin_dashboard'))
+            elif role == 'doctor':
+                return redirect(url_for('doctor.doctor_dashboard'))
+            else:
+                return redirect(url_for('patient.patient_dashboard'))
+        else:
+            flash('Invalid credentials', 'danger')
+    
+    return render_template('login.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+        age = request.form.get('age')
+        gender = request.form.get('gender')
+        address = request.form.get('address')
+        
+        # Check if username or email already exists
+        existing_patient = Patient.query.filter(
+            or_(Patient.username == username, Patient.email == email)
+        ).first()
+        
+        if existing_patient:
+            flash('Username or email already exists', 'danger')
+            return redirect(url_for('auth.register'))
+        
+        # Normalize age so it is never negative
+        if age:
+            age_val = int(age)
+            if age_val < 0:
+                age_val = 0
+        else:
+            age_val = None
+        
+        patient = Patient(
+            username=username,
+            name=name,
+            email=email,
+            phone=phone,
+             age=age_val,
+            gender=gender,
+            address=address
+        )
+        patient.set_password(password)
+        
+        db.session.add(patient)
+        db.session.commit()
+        
+        flash('Registration successful! Please login', 'success')
+        return redirect(url_for('auth.login'))
+    
+    return render_template('register.html')
+
+@bp.route('/logout')
+def logout():
+    session.clear()
+    flash('Logged out successfully', 'success')
+    return redirect(url_for('auth.login'))
@@ -0,0 +1,203 @@
+"""Doctor availability: diff-based saves and recurring weekly templates.
+
+save_week() compares the submitted week with the stored rows and only
+inserts, updates or deletes the days that actually changed, so a save that
+changes nothing writes nothing and readers never see the week half-cleared.
+
+Weekly templates (AvailabilityTemplate) hold a doctor's usual hours per
+weekday. materialize() copies them into DoctorAvailability for every date
+in the window that has no row yet; a day the doctor switched off stays as
+an is_available = 0 row so the template does not bring it back. The app
+materializes lazily, once per day per process (ensure_materialized), and
+the same step can be run ahead of time from cron:
+
+Usage: python availability.py [--days 14]
+"""
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import and_, delete, exists, func, insert, literal, select, text
+
+from models import db, Doctor, DoctorAvailability, AvailabilityTemplate
+from cache import invalidate_after_commit
+from slots import rebuild_after_commit
+import rollups
+
+WINDOW_DAYS = 7
+# Readers show today .. today + 7 inclusive
+MATERIALIZE_DAYS = WINDOW_DAYS + 1
+
+_materialized_on = {}
+
+
+def _templates(doctor_id):
+    return {t.weekday: t for t in AvailabilityTemplate.query.filter_by(doctor_id=doctor_id)}
+
+
+def save_week(doctor_id, wanted, today, days=WINDOW_DAYS):
+    # wanted maps date -> (start_time, end_time) for the days the doctor is
+    # available; returns the number of rows written. The caller commits.
+    existing = {}
+    for row in DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date >= today,
+        DoctorAvailability.date < today + timedelta(days=days)
+    ).order_by(DoctorAvailability.id):
+        existing.setdefault(row.date, []).append(row)
+    templates = _templates(doctor_id)
+
+    changes = 0
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        rows = existing.get(day, [])
+        row = rows[0] if rows else None
+        # Older saves could leave more than one row per day
+        for extra in rows[1:]:
+            db.session.delete(extra)
+            changes += 1
+
+        if day in wanted:
+            start, end = wanted[day]
+            if row is None:
+                db.session.add(DoctorAvailability(doctor_id=doctor_id, date=day, start_time=start,
+                                                  end_time=end, is_available=True))
+                changes += 1
+            elif (row.start_time, row.end_time, row.is_available) != (start, end, True):
+                row.start_time, row.end_time, row.is_available = start, end, True
+                changes += 1
+        elif day.weekday() in templates:
+            # Keep a day-off marker, or the template would fill the day again
+            if row is None:
+                template = templates[day.weekday()]
+                db.session.add(DoctorAvailability(doctor_id=doctor_id, date=day, start_time=template.start_time,
+                                                  end_time=template.end_time, is_available=False))
+                changes += 1
+            elif row.is_available:
+                row.is_available = False
+                changes += 1
+        elif row is not None:
+            db.session.delete(row)
+            changes += 1
+    return changes
+
+
+def save_templates(doctor_id, wanted, today):
+    # wanted maps weekday -> (start_time, end_time). Future rows that still
+    # carry a changed template's old hours follow the new template.
+    templates = _templates(doctor_id)
+    changed = {}
+    for weekday in range(7):
+        template = templates.get(weekday)
+        hours = wanted.get(weekday)
+        old = (template.start_time, template.end_time) if template else None
+        if old == hours:
+            continue
+        changed[weekday] = (old, hours)
+        if template is None:
+            db.session.add(AvailabilityTemplate(doctor_id=doctor_id, weekday=weekday,
+                                                start_time=hours[0], end_time=hours[1]))
+        elif hours is None:
+            db.session.delete(template)
+        else:
+            template.start_time, template.end_time = hours
+
+    if changed:
+        for row in DoctorAvailability.query.filter(
+            DoctorAvailability.doctor_id == doctor_id,
+            DoctorAvailability.date >= today,
+            DoctorAvailability.is_available == True
+        ):
+            old, hours = changed.get(row.date.weekday(), (None, None))
+            if old is None or (row.start_time, row.end_time) != old:
+                continue
+            if hours is None:
+                db.session.delete(row)
+            else:
+                row.start_time, row.end_time = hours
+        db.session.flush()
+        materialize(today, doctor_id=doctor_id)
+    return len(changed)
+
+
+def materialize(today=None, days=MATERIALIZE_DAYS, doctor_id=None):
+    # One INSERT ... SELECT per date; NOT EXISTS skips the days that already
+    # have a row, and OR IGNORE (on the unique doctor/date index) drops the
+    # rows another process inserted first, so it is safe to repeat and to
+    # race with other processes
+    today = today or date.today()
+    inserted = 0
+    filled = []
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        source = select(
+            AvailabilityTemplate.doctor_id, literal(day, db.Date), AvailabilityTemplate.start_time,
+            AvailabilityTemplate.end_time, literal(True)
+        ).join(Doctor, Doctor.id == AvailabilityTemplate.doctor_id).where(
+            AvailabilityTemplate.weekday == day.weekday(),
+            Doctor.is_active == True,
+            ~exists().where(and_(DoctorAvailability.doctor_id == AvailabilityTemplate.doctor_id,
+                                 DoctorAvailability.date == day))
+        )
+        if doctor_id is not None:
+            source = source.where(AvailabilityTemplate.doctor_id == doctor_id)
+        rows = db.session.connection().execute(
+            insert(DoctorAvailability.__table__).prefix_with('OR IGNORE').from_select(
+                ['doctor_id', 'date', 'start_time', 'end_time', 'is_available'], source)
+        ).rowcount
+        if rows:
+            filled.append(day)
+            inserted += rows
+    if inserted:
+        # Core inserts skip the flush events, so queue the cache keys and the
+        # slot grid rebuild for after_commit the same way they would
+        invalidate_after_commit(db.session, [DoctorAvailability])
+        rebuild_after_commit(db.session)
+        rollups.mark_days(db.session.connection(), filled)
+    return inserted
+
+
+def remove_duplicate_days():
+    # Older saves and racing materializations could leave more than one row
+    # per doctor and day; keep the first (as save_week does) so the unique
+    # index can be built. The caller commits.
+    table = DoctorAvailability.__table__
+    connection = db.session.connection()
+    duplicates = table.c.id.not_in(select(func.min(table.c.id)).group_by(table.c.doctor_id, table.c.date))
+    days = {d for (d,) in connection.execute(select(table.c.date).where(duplicates).distinct())}
+    if days:
+        connection.execute(delete(table).where(duplicates))
+        rollups.mark_days(connection, days)
+        invalidate_after_commit(db.session, [DoctorAvailability])
+        rebuild_after_commit(db.session)
+    # The non-unique index the unique one replaces
+    connection.execute(text('DROP INDEX IF EXISTS ix_doctor_availability_doctor_date'))
+    return len(days)
+
+
+def ensure_materialized(today=None):
+    today = today or date.today()
+    url = str(db.engine.url)
+    if _materialized_on.get(url) == today:
+        return
+    materialize(today)
+    db.session.commit()
+    _materialized_on[url] = today
+
+
+def main():
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    parser = argparse.ArgumentParser(description='Materialize weekly availability templates.')
+    parser.add_argument('--days', type=int, default=14)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        inserted = materialize(days=args.days)
+        db.session.commit()
+        print(f'Materialized {inserted} availability rows for the next {args.days} days')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Fire parallel bookings at a handful of contested slots and check that no
+slot ends up double-booked.
+
+Usage: python benchmarks/booking_stress.py [--workers 8] [--bookings 4000] [--slots 20]
+
+Each worker is a separate process with its own app and engine, posting to
+book_appointment through the Flask test client against a shared throwaway
+SQLite database. Exits non-zero if any double booking is found.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+DOCTORS = 2
+PATIENTS = 50
+
+
+def slot_form(slot):
+    day = date.today() + timedelta(days=1 + slot // 40)
+    minutes = 9 * 60 + (slot % 40) * 15
+    return {'date': day.isoformat(), 'time': f'{minutes // 60:02d}:{minutes % 60:02d}', 'reason': 'stress'}
+
+
+def setup_database():
+    from app import create_app
+    from models import db, Department, Doctor, Patient
+
+    app = create_app({'BLUEPRINTS': []})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Department(id=1, name='General Medicine'))
+        for i in range(1, DOCTORS + 1):
+            db.session.add(Doctor(id=i, username=f'doc{i}', password_hash='x', name=f'Doc {i}',
+                                  email=f'doc{i}@example.com', specialization='General', department_id=1))
+        for i in range(1, PATIENTS + 1):
+            db.session.add(Patient(id=i, username=f'pat{i}', password_hash='x', name=f'Pat {i}',
+                                   email=f'pat{i}@example.com'))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def worker(worker_id, bookings, slots, start_event, results):
+    from app import create_app
+
+    app = create_app()
+    rng = random.Random(worker_id)
+    client = app.test_client()
+    booked = errors = 0
+    start_event.wait()
+    for _ in range(bookings):
+        with client.session_transaction() as sess:
+            # Nobody follows the redirect to read the flash, so drop it
+            sess.clear()
+            sess['user_id'] = rng.randint(1, PATIENTS)
+            sess['role'] = 'patient'
+            sess['username'] = 'patient'
+        doctor_id = rng.randint(1, DOCTORS)
+        response = client.post(f'/patient/book_appointment/{doctor_id}', data=slot_form(rng.randrange(slots)))
+        if response.status_code != 302:
+            errors += 1
+        elif response.headers['Location'].endswith('/patient/dashboard'):
+            booked += 1
+    results.put((booked, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--bookings', type=int, default=4000, help='total booking attempts')
+    parser.add_argument('--slots', type=int, default=20, help='contested slots per doctor')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    try:
+        setup_database()
+
+        ctx = multiprocessing.get_context('spawn')
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        per_worker = args.bookings // args.workers
+        procs = [ctx.Process(target=worker, args=(i, per_worker, args.slots, start_event, results))
+                 for i in range(args.workers)]
+        for p in procs:
+            p.start()
+        # Let every worker finish importing the app before the clock starts
+        time.sleep(3)
+        started = time.perf_counter()
+        start_event.set()
+        outcomes = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - started
+        for p in procs:
+            p.join()
+
+        conn = sqlite3.connect(path)
+        doubles = conn.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM appointment WHERE status = 'Booked' "
+            "GROUP BY doctor_id, date, time HAVING count(*) > 1)"
+        ).fetchone()[0]
+        rows = conn.execute("SELECT count(*) FROM appointment WHERE status = 'Booked'").fetchone()[0]
+        conn.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    attempts = per_worker * args.workers
+    booked = sum(b for b, _ in outcomes)
+    errors = sum(e for _, e in outcomes)
+    print(f'{attempts} booking attempts from {args.workers} workers in {elapsed:.2f}s '
+          f'({attempts / elapsed:.0f} requests/s)')
+    print(f'{booked} succeeded, {attempts - booked - errors} rejected as taken, {errors} errors')
+    print(f'{rows} booked rows for {DOCTORS * args.slots} slots, {doubles} double-booked slots')
+
+    ok = doubles == 0 and errors == 0 and booked == rows
+    print('PASS' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Fill the database with seeded, realistic-looking synthetic data.
+
+Usage: python benchmarks/generate_data.py [--doctors 2000] [--patients 1000000]
+           [--appointments 2000000] [--seed 42] [--batch-size 10000]
+
+Targets DATABASE_URL (default: the app's hospital.db), so point it at a
+scratch file for benchmarking:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/generate_data.py
+
+Every generated account (bench_admin, doctor<N>, patient<N>) has the password
+"password"; it is hashed once and reused so generation is not dominated by
+key derivation. Appointments span the last two years (Completed/Cancelled,
+most Completed ones with a Treatment) and the next two weeks (mostly
+Booked); every doctor publishes availability for the next 7 days.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import func, insert
+
+from app import create_app
+from models import db, Admin, Doctor, Patient, Appointment, Treatment, Department, DoctorAvailability
+from passwords import hash_password
+from dashboard_stats import reconcile
+import roster
+import rollups
+
+PASSWORD = 'password'
+
+DEPARTMENTS = {
+    'Cardiology': ['Cardiologist', 'Interventional Cardiologist'],
+    'Orthopedics': ['Orthopedic Surgeon', 'Sports Medicine'],
+    'Neurology': ['Neurologist', 'Neurosurgeon'],
+    'Pediatrics': ['Pediatrician', 'Neonatologist'],
+    'General Medicine': ['General Physician', 'Internal Medicine'],
+    'Dermatology': ['Dermatologist'],
+    'Oncology': ['Medical Oncologist', 'Radiation Oncologist'],
+    'ENT': ['Otolaryngologist'],
+}
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'Arjun', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Lakshmi',
+               'Wei', 'Mei', 'Carlos', 'Sofia', 'Ahmed', 'Fatima', 'Olga', 'Ivan', 'Kenji', 'Yuki']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Sharma', 'Reddy', 'Nair', 'Iyer', 'Rao', 'Gupta', 'Chen', 'Wang', 'Lopez',
+              'Hernandez', 'Khan', 'Ali', 'Petrov', 'Ivanova', 'Tanaka', 'Sato', 'Muller']
+DIAGNOSES = [('Hypertension', 'Amlodipine 5mg'), ('Influenza', 'Oseltamivir 75mg'),
+             ('Migraine', 'Sumatriptan 50mg'), ('Sprained ankle', 'Ibuprofen 400mg'),
+             ('Dermatitis', 'Hydrocortisone cream'), ('Otitis media', 'Amoxicillin 500mg'),
+             ('Type 2 diabetes', 'Metformin 500mg'), ('Back pain', 'Physiotherapy')]
+REASONS = ['Routine check-up', 'Follow-up', 'Chest pain', 'Headache', 'Fever', 'Joint pain',
+           'Skin rash', 'Ear ache', 'Prescription renewal', None]
+SLOTS = [dtime(h, m) for h in range(9, 17) for m in (0, 15, 30, 45)]
+
+
+def person_name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def insert_batches(table, rows, batch_size, label, prefix=None):
+    statement = insert(table)
+    if prefix:
+        statement = statement.prefix_with(prefix)
+    start = time.perf_counter()
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(statement, batch)
+            db.session.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(statement, batch)
+        db.session.commit()
+        count += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {count:,} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f} rows/s)')
+
+
+def next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def generate(doctors, patients, appointments, seed, batch_size):
+    rng = random.Random(seed)
+    today = date.today()
+    password_hash = hash_password(PASSWORD)
+
+    if not Admin.query.filter_by(username='bench_admin').first():
+        admin = Admin(username='bench_admin', email='bench_admin@hospital.com', password_hash=password_hash)
+        db.session.add(admin)
+    for name in DEPARTMENTS:
+        if not Department.query.filter_by(name=name).first():
+            db.session.add(Department(name=name, description=f'{name} department'))
+    db.session.commit()
+    departments = [(d.id, DEPARTMENTS.get(d.name, [d.name])) for d in Department.query.all()]
+
+    first_doctor = next_id(Doctor)
+    def doctor_rows():
+        for i in range(first_doctor, first_doctor + doctors):
+            dept_id, specializations = rng.choice(departments)
+            yield {'id': i, 'username': f'doctor{i}', 'password_hash': password_hash,
+                   'name': 'Dr. ' + person_name(rng), 'email': f'doctor{i}@hospital.com',
+                   'phone': f'9{rng.randrange(10**9):09d}', 'specialization': rng.choice(specializations),
+                   'department_id': dept_id, 'experience': rng.randint(1, 35),
+                   'is_active': rng.random() > 0.02}
+    insert_batches(Doctor.__table__, doctor_rows(), batch_size, 'doctors')
+
+    first_patient = next_id(Patient)
+    def patient_rows():
+        for i in range(first_patient, first_patient + patients):
+            yield {'id': i, 'username': f'patient{i}', 'password_hash': password_hash,
+                   'name': person_name(rng), 'email': f'patient{i}@example.com',
+                   'phone': f'8{rng.randrange(10**9):09d}', 'age': rng.randint(0, 95),
+                   'gender': rng.choice(['Male', 'Female', 'Other']), 'address': f'{rng.randint(1, 999)} Main Street',
+                   'is_active': rng.random() > 0.01, 'is_blacklisted': rng.random() < 0.002}
+    insert_batches(Patient.__table__, patient_rows(), batch_size, 'patients')
+
+    doctor_ids = range(first_doctor, first_doctor + doctors)
+    patient_ids = range(first_patient, first_patient + patients)
+
+    def availability_rows():
+        for doctor_id in doctor_ids:
+            for offset in range(7):
+                if rng.random() < 0.8:
+                    start = rng.choice([8, 9, 10])
+                    yield {'doctor_id': doctor_id, 'date': today + timedelta(days=offset),
+                           'start_time': dtime(start), 'end_time': dtime(start + rng.choice([4, 6, 8])),
+                           'is_available': True}
+    insert_batches(DoctorAvailability.__table__, availability_rows(), batch_size, 'availability')
+
+    first_appointment = next_id(Appointment)
+    treated = []
+
+    def appointment_rows():
+        for i in range(first_appointment, first_appointment + appointments):
+            day = today + timedelta(days=rng.randint(-730, 14))
+            if day < today:
+                status = 'Completed' if rng.random() < 0.8 else 'Cancelled'
+            else:
+                status = 'Booked' if rng.random() < 0.9 else 'Cancelled'
+            if status == 'Completed' and rng.random() < 0.9:
+                treated.append(i)
+            yield {'id': i, 'patient_id': rng.choice(patient_ids), 'doctor_id': rng.choice(doctor_ids),
+                   'date': day, 'time': rng.choice(SLOTS), 'status': status, 'reason': rng.choice(REASONS)}
+    # OR IGNORE drops the few Booked rows that land on an already booked slot
+    insert_batches(Appointment.__table__, appointment_rows(), batch_size, 'appointments', prefix='OR IGNORE')
+
+    def treatment_rows():
+        for appointment_id in treated:
+            diagnosis, prescription = rng.choice(DIAGNOSES)
+            yield {'appointment_id': appointment_id, 'diagnosis': diagnosis,
+                   'prescription': prescription, 'notes': rng.choice(['', 'Review in 2 weeks', 'Stable'])}
+    insert_batches(Treatment.__table__, treatment_rows(), batch_size, 'treatments')
+
+    reconcile(verbose=False)
+    roster.rebuild(verbose=False)
+    rollups.rebuild(verbose=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic data.')
+    parser.add_argument('--doctors', type=int, default=2000)
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--appointments', type=int, default=2_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_app({'BLUEPRINTS': []})
+    with app.app_context():
+        db.create_all()
+        generate(args.doctors, args.patients, args.appointments, args.seed, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure how long a fresh process takes to import and build the app.
+
+Usage: python benchmarks/import_benchmark.py [--runs 10] [--scenarios NAME ...]
+           [--importtime NAME] [--top 15]
+
+Every run is a new interpreter (like a worker, a CLI tool or a test
+process starting up), so nothing is already imported. For each scenario it
+reports the median and best time to import and call create_app(), how many
+modules ended up loaded and whether NumPy was among them. --importtime
+NAME prints one scenario's `python -X importtime` report, summed per
+package, and its slowest modules.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name -> code run in the fresh process
+SCENARIOS = {
+    'web (all blueprints)': "from app import create_app; app = create_app()",
+    'admin only': "from app import create_app; app = create_app({'BLUEPRINTS': ['admin']})",
+    'doctor only': "from app import create_app; app = create_app({'BLUEPRINTS': ['doctor']})",
+    'patient only': "from app import create_app; app = create_app({'BLUEPRINTS': ['patient']})",
+    'scripts (no blueprints)': "from app import create_app; app = create_app({'BLUEPRINTS': []})",
+    'models only': "import models",
+}
+
+PROBE = '''
+import sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(elapsed, len(sys.modules), 'numpy' in sys.modules)
+'''
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run_once(code, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE.format(code=code)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    elapsed, modules, numpy = result.stdout.split()
+    return float(elapsed), int(modules), numpy == 'True', result.stderr
+
+
+def measure(code, runs):
+    times = []
+    for _ in range(runs):
+        elapsed, modules, numpy, _ = run_once(code)
+        times.append(elapsed)
+    return statistics.median(times), min(times), modules, numpy
+
+
+def print_importtime(name, top):
+    *_, stderr = run_once(SCENARIOS[name], importtime=True)
+    rows = [(int(self_us), module) for self_us, _, _, module in IMPORTTIME.findall(stderr)]
+    packages = {}
+    for self_us, module in rows:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f'\n-X importtime for {name!r}, self time summed per top-level package')
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f'  {self_us / 1000:8.1f} ms  {package}')
+    print('\nslowest single modules (self time)')
+    for self_us, module in sorted(rows, reverse=True)[:top]:
+        print(f'  {self_us / 1000:8.1f} ms  {module}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--importtime', choices=sorted(SCENARIOS), help='print the -X importtime breakdown')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    print(f'{args.runs} fresh interpreters per scenario (import + create_app)')
+    print(f'{"scenario":<26} {"median ms":>10} {"best ms":>9} {"modules":>8} {"numpy":>6}')
+    for name in args.scenarios:
+        median, best, modules, numpy = measure(SCENARIOS[name], args.runs)
+        print(f'{name:<26} {median * 1000:>10.1f} {best * 1000:>9.1f} {modules:>8} {"yes" if numpy else "no":>6}')
+
+    if args.importtime:
+        print_importtime(args.importtime, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+"""End-to-end load benchmark for every route.
+
+Usage: python benchmarks/load_benchmark.py [--requests 200] [--concurrency 4]
+           [--routes NAME ...] [--save baseline.json] [--compare baseline.json]
+           [--threshold 15] [--seed 42]
+
+Runs against the database in DATABASE_URL, which should first be filled with
+benchmarks/generate_data.py. Each scenario sends --requests requests through
+the Flask test client from --concurrency threads, picking a random doctor,
+patient or appointment for every request so caches see a realistic mix.
+Requests that change data (booking, cancelling, treatments, admin edits and
+bulk actions) are included, so use a scratch database. The scenarios that
+toggle, remove, blacklist or bulk-(de)activate accounts only pick the
+SPARE_ACCOUNTS doctors and patients with the highest ids, and every other
+scenario leaves those out.
+
+Not benchmarked:
+    /, /logout              a redirect, no database work
+    /healthz, /readyz       probes; serve_benchmark.py polls /readyz
+    /static/...             served by the web server in production
+    GET of the edit forms   register, edit_profile, add/update/edit doctor,
+                            edit patient, reschedule: the scenario for the
+                            POST runs the same lookups
+    /api/...                api.py is a separate ASGI app (not Flask)
+
+Reports p50/p95/p99 latency, throughput, SQL statements per request (from
+the X-SQL-Queries header) and how much the process's resident memory grew
+during the scenario (Linux only; caches filling up show here first).
+--save writes the results as JSON; --compare diffs the run against such a
+file and exits non-zero when p95 latency or the SQL count of any route got
+worse by more than --threshold percent.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import func
+
+from app import create_app
+from models import db, Admin, Doctor, Patient, Appointment, Department
+
+app = create_app()
+
+PASSWORD = 'password'
+SAMPLE_SIZE = 2000
+SPARE_ACCOUNTS = 10
+SLOT_TIMES = [f'{h:02d}:{m:02d}' for h in range(9, 17) for m in (0, 15, 30, 45)]
+
+
+def sample(query, id_column, rng):
+    # A seeded window of consecutive ids: repeatable, and cheap on big tables
+    low, high = query.with_entities(func.min(id_column), func.max(id_column)).one()
+    if low is None:
+        return []
+    start = rng.randint(low, max(low, high - SAMPLE_SIZE * 10))
+    return query.filter(id_column >= start).order_by(id_column).limit(SAMPLE_SIZE).all()
+
+
+class Fixtures:
+    """Ids the scenarios pick from, loaded once before the run."""
+
+    def __init__(self, rng):
+        self.today = today = date.today()
+        admin = Admin.query.filter_by(username='bench_admin').first() or Admin.query.first()
+        self.admin_id = admin.id if admin else None
+        # (id, name, email) of the accounts the toggle/remove/blacklist/bulk
+        # scenarios change, whatever state an earlier run left them in
+        self.spare_doctors = db.session.query(Doctor.id, Doctor.name, Doctor.email).order_by(
+            Doctor.id.desc()).limit(SPARE_ACCOUNTS).all()
+        self.spare_patients = db.session.query(Patient.id, Patient.name, Patient.email).order_by(
+            Patient.id.desc()).limit(SPARE_ACCOUNTS).all()
+        spare_doctors = {d for d, _, _ in self.spare_doctors}
+        spare_patients = {p for p, _, _ in self.spare_patients}
+        self.doctors = [d for (d,) in sample(
+            db.session.query(Doctor.id).filter(Doctor.is_active == True), Doctor.id, rng)
+            if d not in spare_doctors]
+        patients = [p for p in sample(db.session.query(Patient.id, Patient.username, Patient.name, Patient.email)
+                                      .filter(Patient.is_active == True, Patient.is_blacklisted == False),
+                                      Patient.id, rng)
+                    if p.id not in spare_patients]
+        self.patients = [p.id for p in patients]
+        self.profiles = [(p.id, p.name, p.email) for p in patients]
+        self.usernames = [p.username for p in patients[:100]]
+        self.visits = sample(db.session.query(Appointment.doctor_id, Appointment.patient_id).filter(
+            Appointment.status == 'Completed'), Appointment.id, rng)
+        # (id, patient_id, doctor_id)
+        self.booked = sample(db.session.query(Appointment.id, Appointment.patient_id, Appointment.doctor_id).filter(
+            Appointment.status == 'Booked', Appointment.date >= today), Appointment.id, rng)
+        self.departments = [d for (d,) in db.session.query(Department.id)]
+        names = db.session.query(Doctor.name).filter(Doctor.id.in_(self.doctors[:50])).all()
+        self.terms = sorted({n.split()[-1] for (n,) in names})
+        if not (self.admin_id and self.doctors and self.patients and self.visits and self.booked
+                and self.spare_doctors and self.spare_patients):
+            raise SystemExit('Database looks empty; run benchmarks/generate_data.py first')
+
+    def future_slot(self, rng):
+        return (self.today + timedelta(days=rng.randint(1, 7))).isoformat(), rng.choice(SLOT_TIMES)
+
+
+# Each scenario returns (role, user_id, method, url, form data)
+
+def admin(path, data=None, method='GET'):
+    return lambda f, rng: ('admin', f.admin_id, method, path, data)
+
+
+def admin_spare(path, pool):
+    # path has {} for the id of one of the spare doctors or patients
+    return lambda f, rng: ('admin', f.admin_id, 'GET', path.format(rng.choice(getattr(f, pool))[0]), None)
+
+
+def admin_export(f, rng):
+    start = (f.today - timedelta(days=30)).isoformat()
+    return 'admin', f.admin_id, 'GET', \
+        f'/admin/export?format={rng.choice(["csv", "ndjson"])}&start={start}&end={f.today.isoformat()}', None
+
+
+def add_doctor(f, rng):
+    username = f'bench_{uuid.uuid4().hex[:12]}'
+    return 'admin', f.admin_id, 'POST', '/admin/add_doctor', {
+        'username': username, 'password': PASSWORD, 'name': 'Bench Doctor', 'email': f'{username}@example.com',
+        'phone': '5550100', 'specialization': 'General', 'department_id': str(rng.choice(f.departments)),
+        'experience': str(rng.randint(0, 30))}
+
+
+def update_doctor(f, rng):
+    doctor_id, name, email = rng.choice(f.spare_doctors)
+    return 'admin', f.admin_id, 'POST', f'/admin/update_doctor/{doctor_id}', {
+        'name': name, 'email': email, 'phone': '5550100', 'specialization': 'General',
+        'department_id': str(rng.choice(f.departments)), 'experience': str(rng.randint(0, 30))}
+
+
+def edit_doctor(f, rng):
+    doctor_id, name, email = rng.choice(f.spare_doctors)
+    return 'admin', f.admin_id, 'POST', f'/admin/doctor/{doctor_id}/edit', {
+        'name': name, 'email': email, 'phone': '5550100', 'specialization': 'General'}
+
+
+def edit_patient(f, rng):
+    patient_id, name, email = rng.choice(f.spare_patients)
+    return 'admin', f.admin_id, 'POST', f'/admin/patient/{patient_id}/edit', {
+        'name': name, 'email': email, 'phone': '5550100'}
+
+
+def admin_mark(action):
+    def scenario(f, rng):
+        appointment_id, _, _ = rng.choice(f.booked)
+        return 'admin', f.admin_id, 'GET', f'/admin/appointment/{appointment_id}/{action}', None
+    return scenario
+
+
+def bulk_appointments(f, rng):
+    ids = [str(a) for a, _, _ in rng.sample(f.booked, min(20, len(f.booked)))]
+    return 'admin', f.admin_id, 'POST', '/admin/appointments/bulk', \
+        {'action': rng.choice(['complete', 'cancel']), 'ids': ids}
+
+
+def bulk_accounts(path, pool):
+    def scenario(f, rng):
+        return 'admin', f.admin_id, 'POST', path, {
+            'action': rng.choice(['activate', 'deactivate']), 'ids': [str(i) for i, _, _ in getattr(f, pool)]}
+    return scenario
+
+
+def cancel_doctor_appointments(f, rng):
+    day = (f.today + timedelta(days=rng.randint(0, 7))).isoformat()
+    return 'admin', f.admin_id, 'POST', f'/admin/doctor/{rng.choice(f.spare_doctors)[0]}/cancel_appointments', \
+        {'start': day, 'end': day}
+
+
+def doctor_dashboard(f, rng):
+    return 'doctor', rng.choice(f.doctors), 'GET', '/doctor/dashboard', None
+
+
+def doctor_availability(f, rng):
+    return 'doctor', rng.choice(f.doctors), 'GET', '/doctor/availability', None
+
+
+def doctor_save_availability(f, rng):
+    form = {}
+    for offset in range(7):
+        day = (f.today + timedelta(days=offset)).isoformat()
+        if rng.random() < 0.8:
+            form.update({f'available_{day}': 'yes', f'start_time_{day}': '09:00', f'end_time_{day}': '17:00'})
+    return 'doctor', rng.choice(f.doctors), 'POST', '/doctor/availability', form
+
+
+def doctor_save_template(f, rng):
+    form = {}
+    for weekday in range(7):
+        if rng.random() < 0.7:
+            form.update({f'template_{weekday}': 'yes', f'template_start_{weekday}': '09:00',
+                         f'template_end_{weekday}': '17:00'})
+    return 'doctor', rng.choice(f.doctors), 'POST', '/doctor/availability/template', form
+
+
+def doctor_cancel(f, rng):
+    appointment_id, _, doctor_id = rng.choice(f.booked)
+    return 'doctor', doctor_id, 'POST', f'/doctor/appointment/{appointment_id}/cancel', None
+
+
+def doctor_mark(status):
+    def scenario(f, rng):
+        appointment_id, _, doctor_id = rng.choice(f.booked)
+        return 'doctor', doctor_id, 'GET', f'/doctor/mark_appointment/{appointment_id}/{status}', None
+    return scenario
+
+
+def treatment_form(f, rng):
+    appointment_id, _, doctor_id = rng.choice(f.booked)
+    return 'doctor', doctor_id, 'GET', f'/doctor/update_treatment/{appointment_id}', None
+
+
+def update_treatment(f, rng):
+    appointment_id, _, doctor_id = rng.choice(f.booked)
+    return 'doctor', doctor_id, 'POST', f'/doctor/update_treatment/{appointment_id}', \
+        {'diagnosis': 'Load test', 'prescription': 'Rest', 'notes': ''}
+
+
+def doctor_patient_history(f, rng):
+    doctor_id, patient_id = rng.choice(f.visits)
+    return 'doctor', doctor_id, 'GET', f'/doctor/patient_history/{patient_id}', None
+
+
+def patient_dashboard(f, rng):
+    return 'patient', rng.choice(f.patients), 'GET', '/patient/dashboard', None
+
+
+def patient_history(f, rng):
+    _, patient_id = rng.choice(f.visits)
+    return 'patient', patient_id, 'GET', '/patient/history', None
+
+
+def earliest_slots(f, rng):
+    return 'patient', rng.choice(f.patients), 'GET', \
+        f'/patient/earliest_slots?k=5&department_id={rng.choice(f.departments)}', None
+
+
+def search_doctors(f, rng):
+    return 'patient', rng.choice(f.patients), 'POST', '/patient/search_doctors', \
+        {'search_query': rng.choice(f.terms)}
+
+
+def book_form(f, rng):
+    return 'patient', rng.choice(f.patients), 'GET', f'/patient/book_appointment/{rng.choice(f.doctors)}', None
+
+
+def book(f, rng):
+    day, slot = f.future_slot(rng)
+    return 'patient', rng.choice(f.patients), 'POST', f'/patient/book_appointment/{rng.choice(f.doctors)}', \
+        {'date': day, 'time': slot, 'reason': 'Load test'}
+
+
+def reschedule(f, rng):
+    appointment_id, patient_id, _ = rng.choice(f.booked)
+    day, slot = f.future_slot(rng)
+    return 'patient', patient_id, 'POST', f'/patient/appointment/{appointment_id}/reschedule', \
+        {'date': day, 'time': slot}
+
+
+def patient_cancel(f, rng):
+    appointment_id, patient_id, _ = rng.choice(f.booked)
+    return 'patient', patient_id, 'GET', f'/patient/cancel_appointment/{appointment_id}', None
+
+
+def edit_profile(f, rng):
+    patient_id, name, email = rng.choice(f.profiles)
+    return 'patient', patient_id, 'POST', '/patient/edit_profile', {
+        'name': name, 'email': email, 'phone': '5550100', 'age': str(rng.randint(18, 90)), 'gender': 'Other',
+        'address': 'Bench Street'}
+
+
+def register(f, rng):
+    username = f'bench_{uuid.uuid4().hex[:12]}'
+    return None, None, 'POST', '/register', {
+        'username': username, 'password': PASSWORD, 'name': 'Bench Patient', 'email': f'{username}@example.com',
+        'phone': '5550100', 'age': str(rng.randint(18, 90)), 'gender': 'Other', 'address': 'Bench Street'}
+
+
+def login(f, rng):
+    return None, None, 'POST', '/login', {'username': rng.choice(f.usernames), 'password': PASSWORD,
+                                          'role': 'patient'}
+
+
+SCENARIOS = {
+    'login': login,
+    'admin_dashboard': admin('/admin/dashboard'),
+    'admin_view_appointments': admin('/admin/view_appointments'),
+    'admin_search_doctor': admin('/admin/search', {'search_query': 'Sharma', 'search_type': 'doctor'}, 'POST'),
+    'admin_search_patient': admin('/admin/search', {'search_query': 'Priya Nair', 'search_type': 'patient'}, 'POST'),
+    'admin_cache_stats': admin('/admin/cache_stats'),
+    'admin_metrics': admin('/admin/metrics'),
+    'admin_analytics': admin('/admin/analytics?days=30'),
+    'admin_export': admin_export,
+    'doctor_dashboard': doctor_dashboard,
+    'doctor_availability': doctor_availability,
+    'doctor_save_availability': doctor_save_availability,
+    'doctor_patient_history': doctor_patient_history,
+    'patient_dashboard': patient_dashboard,
+    'patient_history': patient_history,
+    'patient_earliest_slots': earliest_slots,
+    'patient_search_doctors': search_doctors,
+    'patient_book_form': book_form,
+    'patient_book': book,
+    'patient_reschedule': reschedule,
+    'patient_edit_profile': edit_profile,
+    'register': register,
+    'doctor_save_template': doctor_save_template,
+    'doctor_treatment_form': treatment_form,
+    # The rest finish or cancel appointments and change accounts
+    'doctor_update_treatment': update_treatment,
+    'doctor_mark_completed': doctor_mark('Completed'),
+    'doctor_cancel': doctor_cancel,
+    'patient_cancel': patient_cancel,
+    'admin_add_doctor': add_doctor,
+    'admin_update_doctor': update_doctor,
+    'admin_edit_doctor': edit_doctor,
+    'admin_edit_patient': edit_patient,
+    'admin_complete_appointment': admin_mark('complete'),
+    'admin_cancel_appointment': admin_mark('cancel'),
+    'admin_bulk_appointments': bulk_appointments,
+    'admin_cancel_doctor_appointments': cancel_doctor_appointments,
+    'admin_toggle_doctor': admin_spare('/admin/doctor/{}/toggle', 'spare_doctors'),
+    'admin_remove_doctor': admin_spare('/admin/remove_doctor/{}', 'spare_doctors'),
+    'admin_bulk_doctors': bulk_accounts('/admin/doctors/bulk', 'spare_doctors'),
+    'admin_toggle_patient': admin_spare('/admin/patient/{}/toggle', 'spare_patients'),
+    'admin_remove_patient': admin_spare('/admin/remove_patient/{}', 'spare_patients'),
+    'admin_blacklist_patient': admin_spare('/admin/patient/{}/blacklist', 'spare_patients'),
+    'admin_bulk_patients': bulk_accounts('/admin/patients/bulk', 'spare_patients'),
+}
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def rss_mb():
+    # Current (not peak) resident set size; None where /proc is missing
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def run_scenario(fixtures, scenario, requests, concurrency, seed):
+    latencies = []
+    statements = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        client = app.test_client()
+        for _ in range(per_thread):
+            role, user_id, method, url, data = scenario(fixtures, rng)
+            if role:
+                with client.session_transaction() as sess:
+                    sess.clear()
+                    sess.update(user_id=user_id, role=role, username='bench')
+            start = time.perf_counter()
+            # buffered: a streamed body (the export) counts towards the latency
+            response = client.open(url, method=method, data=data, buffered=True)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statements.append(int(response.headers.get('X-SQL-Queries', 0)))
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'sql_per_request': round(sum(statements) / len(statements), 1),
+        'sql_max': max(statements),
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_before is not None else None,
+    }
+
+
+def print_results(results):
+    print(f'{"route":<34} {"req":>5} {"err":>4} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"sql":>6} {"+rss MB":>7}')
+    for name, r in results.items():
+        rss = '-' if r['rss_growth_mb'] is None else f'{r["rss_growth_mb"]:+.1f}'
+        print(f'{name:<34} {r["requests"]:>5} {r["errors"]:>4} {r["throughput_rps"]:>8.1f} '
+              f'{r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} {r["p99_ms"]:>8.2f} '
+              f'{r["sql_per_request"]:>6.1f} {rss:>7}')
+
+
+def compare(results, baseline, threshold):
+    regressions = 0
+    print(f'\n{"route":<34} {"p95 ms":>17} {"change":>8} {"sql":>13} {"change":>8}')
+    for name, r in results.items():
+        old = baseline['routes'].get(name)
+        if old is None:
+            print(f'{name:<34} (not in baseline)')
+            continue
+        changes = []
+        flagged = False
+        for key in ('p95_ms', 'sql_per_request'):
+            change = (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes.append((old[key], r[key], change))
+            flagged = flagged or change > threshold
+        regressions += flagged
+        (old_p95, new_p95, p95_change), (old_sql, new_sql, sql_change) = changes
+        print(f'{name:<34} {old_p95:>8.2f}->{new_p95:<8.2f} {p95_change:>+7.1f}% '
+              f'{old_sql:>6.1f}->{new_sql:<6.1f} {sql_change:>+7.1f}%' + ('  REGRESSION' if flagged else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--routes', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=15.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app.config['SQL_QUERY_COUNT_HEADER'] = True
+    results = {}
+    with app.app_context():
+        fixtures = Fixtures(random.Random(args.seed))
+        meta = {
+            'doctors': db.session.query(func.count(Doctor.id)).scalar(),
+            'patients': db.session.query(func.count(Patient.id)).scalar(),
+            'appointments': db.session.query(func.count(Appointment.id)).scalar(),
+        }
+        db.session.remove()
+    print(f'{meta["doctors"]:,} doctors, {meta["patients"]:,} patients, '
+          f'{meta["appointments"]:,} appointments; concurrency {args.concurrency}\n')
+
+    for name in args.routes:
+        results[name] = run_scenario(fixtures, SCENARIOS[name], args.requests, args.concurrency, args.seed)
+    print_results(results)
+
+    meta.update(requests=args.requests, concurrency=args.concurrency, seed=args.seed,
+                python=platform.python_version(), cpus=os.cpu_count())
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'routes': results}, f, indent=2)
+        print(f'\nSaved results to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('appointments') != meta['appointments']:
+            print('\nNote: baseline was recorded on a different data volume')
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Measure login throughput for different password hashing settings.
+
+Usage: python benchmarks/login_benchmark.py [--threads 8] [--logins 200]
+           [--methods scrypt:32768:8:1 pbkdf2:sha256:600000] [--workers 0 4]
+
+For every (method, hash workers) pair, drives POST /login through the Flask
+test client from --threads concurrent threads against a throwaway SQLite
+database and reports successful logins per second. Workers 0 hashes inline
+on the request thread.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PATIENTS = 20
+PASSWORD = 'correct horse battery staple'
+
+
+def run_logins(app, threads, logins):
+    per_thread = logins // threads
+    failures = []
+
+    def worker(n):
+        client = app.test_client()
+        for i in range(per_thread):
+            response = client.post('/login', data={
+                'username': f'pat{(n + i) % PATIENTS}', 'password': PASSWORD, 'role': 'patient'
+            })
+            if not response.headers.get('Location', '').endswith('/patient/dashboard'):
+                failures.append(response.status_code)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads, elapsed, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--methods', nargs='+',
+                        default=['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[0, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import create_app
+    from models import db
+    app = create_app()
+    from models import Patient
+    import passwords
+
+    print(f'{"method":<24} {"workers":>7} {"logins/s":>10} {"ms/login":>9}')
+    try:
+        with app.app_context():
+            db.create_all()
+            for i in range(PATIENTS):
+                db.session.add(Patient(username=f'pat{i}', password_hash='', name=f'Pat {i}',
+                                       email=f'pat{i}@example.com'))
+            db.session.commit()
+
+            for method in args.methods:
+                app.config['PASSWORD_HASH_METHOD'] = method
+                app.config['PASSWORD_HASH_WORKERS'] = 0
+                # Store hashes made with this method so login does not rehash
+                stored = passwords.hash_password(PASSWORD)
+                Patient.query.update({Patient.password_hash: stored})
+                db.session.commit()
+
+                for workers in args.workers:
+                    passwords.shutdown_pool()
+                    app.config['PASSWORD_HASH_WORKERS'] = workers
+                    count, elapsed, failed = run_logins(app, args.threads, args.logins)
+                    note = f'  ({failed} failed)' if failed else ''
+                    print(f'{method:<24} {workers:>7} {count / elapsed:>10.1f} '
+                          f'{elapsed / count * 1000:>9.1f}{note}')
+            passwords.shutdown_pool()
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
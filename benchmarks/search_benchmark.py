@@ -0,0 +1,100 @@
+"""Compare FTS5 and ilike search over a large patient table.
+
+Usage: python benchmarks/search_benchmark.py [--patients 1000000] [--repeat 5]
+
+Builds a throwaway SQLite database next to the system temp dir, fills it with
+synthetic patients and times search.search_patients() through both paths.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'Arjun', 'Priya', 'Rahul', 'Ananya', 'Wei', 'Mei',
+               'Carlos', 'Sofia', 'Ahmed', 'Fatima', 'Olga', 'Ivan', 'Kenji', 'Yuki']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Sharma', 'Reddy', 'Nair', 'Iyer', 'Chen', 'Wang', 'Lopez', 'Hernandez',
+              'Khan', 'Ali', 'Petrov', 'Ivanova', 'Tanaka', 'Sato', 'Muller', 'Schmidt']
+TERMS = ['Priya', 'sharma', 'kenj', 'Olga Petrov', 'john.smith12']
+
+
+def fill_patients(db, count, batch=50000):
+    rng = random.Random(42)
+    insert = ('INSERT INTO patient (username, password_hash, name, email, is_active, is_blacklisted) '
+              'VALUES (?, ?, ?, ?, 1, 0)')
+    with db.engine.begin() as conn:
+        for start in range(0, count, batch):
+            rows = []
+            for i in range(start, min(start + batch, count)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                rows.append((f'user{i}', 'x', f'{first} {last}',
+                             f'{first.lower()}.{last.lower()}{i}@example.com'))
+            conn.exec_driver_sql(insert, rows)
+
+
+def time_search(search, term, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # .all() like admin_search, which renders every match
+        matches = search.search_patients(term).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, len(matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import create_app
+    from models import db
+    app = create_app({'BLUEPRINTS': []})
+    import search
+
+    try:
+        with app.app_context():
+            db.create_all()
+            if not search.fts_enabled():
+                print('FTS5 is not available in this SQLite build; only the ilike path can run')
+
+            start = time.perf_counter()
+            fill_patients(db, args.patients)
+            print(f'Inserted {args.patients:,} patients in {time.perf_counter() - start:.1f}s')
+            print()
+            print(f'{"term":<16} {"matches":>8} {"fts5 ms":>10} {"ilike ms":>10} {"speedup":>9}')
+
+            key = str(db.engine.url)
+            fts = search.fts_enabled()
+            for term in TERMS:
+                fts_ms = None
+                if fts:
+                    search._fts_ready[key] = True
+                    fts_ms, _ = time_search(search, term, args.repeat)
+                search._fts_ready[key] = False
+                ilike_ms, matches = time_search(search, term, args.repeat)
+                search._fts_ready[key] = fts
+
+                if fts_ms is None:
+                    print(f'{term:<16} {matches:>8} {"-":>10} {ilike_ms:>10.2f} {"-":>9}')
+                else:
+                    print(f'{term:<16} {matches:>8} {fts_ms:>10.2f} {ilike_ms:>10.2f} {ilike_ms / fts_ms:>8.1f}x')
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
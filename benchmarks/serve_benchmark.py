@@ -0,0 +1,243 @@
+"""Throughput of the production server (gunicorn + wsgi:app) by worker count.
+
+Usage: python benchmarks/serve_benchmark.py [--workers 1 2 4 8] [--clients 16]
+           [--duration 10] [--doctors 200] [--patients 2000] [--appointments 20000]
+
+Builds a throwaway SQLite database, then for each worker count starts
+`gunicorn -c gunicorn.conf.py wsgi:app` (preloaded, WEB_CONCURRENCY=N) on a
+free local port and waits for /readyz. --clients client processes each log
+in once as a random patient or doctor and then request that role's pages
+over real HTTP for --duration seconds. The server is stopped with SIGTERM,
+as a process manager would, and must exit cleanly.
+
+Reports requests/s, p50/p95 latency, errors, speed-up over the first
+worker count, the time to become ready and the time to shut down.
+Throughput stops growing once the workers outnumber the CPUs (or once
+SQLite's single writer is the bottleneck), so run it on the target machine.
+The environment is passed on to gunicorn: without a CACHE_BACKEND, runs
+with more than one worker have the per-process caches switched off (see
+gunicorn.conf.py), as they would in production.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, time as dtime, timedelta
+from urllib.parse import urlencode
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'password'
+# Cheap hashes: the benchmark measures serving, not key derivation
+HASH_METHOD = 'pbkdf2:sha256:1000'
+
+PAGES = {
+    'patient': [('GET', '/patient/dashboard', None), ('GET', '/patient/history', None),
+                ('GET', '/patient/earliest_slots', None),
+                ('POST', '/patient/search_doctors', {'search_query': 'Doc'})],
+    'doctor': [('GET', '/doctor/dashboard', None), ('GET', '/doctor/availability', None)],
+}
+
+
+def setup_database(doctors, patients, appointments):
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from app import create_app
+    from models import db, Department, Doctor, Patient, Appointment, DoctorAvailability
+    from dashboard_stats import reconcile
+    import roster
+    import rollups
+
+    app = create_app({'BLUEPRINTS': []})
+    rng = random.Random(42)
+    password_hash = generate_password_hash(PASSWORD, HASH_METHOD)
+    today = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Department(id=1, name='General Medicine'))
+        db.session.execute(insert(Doctor), [
+            {'id': i, 'username': f'doc{i}', 'password_hash': password_hash, 'name': f'Doc {i}',
+             'email': f'doc{i}@example.com', 'specialization': 'General', 'department_id': 1}
+            for i in range(1, doctors + 1)])
+        db.session.execute(insert(Patient), [
+            {'id': i, 'username': f'pat{i}', 'password_hash': password_hash, 'name': f'Pat {i}',
+             'email': f'pat{i}@example.com'}
+            for i in range(1, patients + 1)])
+        db.session.execute(insert(DoctorAvailability), [
+            {'doctor_id': i, 'date': today + timedelta(days=d), 'start_time': dtime(9), 'end_time': dtime(17)}
+            for i in range(1, doctors + 1) for d in range(7)])
+        # One appointment per (doctor, day, slot), half in the past
+        slots = rng.sample(range(doctors * 60 * 32), appointments)
+        db.session.execute(insert(Appointment), [
+            {'doctor_id': s // (60 * 32) + 1, 'patient_id': rng.randint(1, patients),
+             'date': today + timedelta(days=s // 32 % 60 - 30),
+             'time': dtime(9 + s % 32 // 4, s % 4 * 15),
+             'status': 'Booked' if s // 32 % 60 >= 30 else rng.choice(['Completed', 'Cancelled'])}
+            for s in slots])
+        db.session.commit()
+        reconcile(verbose=False)
+        roster.rebuild(verbose=False)
+        rollups.rebuild(verbose=False)
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(port, method, path, form=None, cookie=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Cookie': cookie} if cookie else {}
+    body = None
+    if form is not None:
+        body = urlencode(form)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Set-Cookie')
+    finally:
+        connection.close()
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode}')
+        try:
+            if request(port, 'GET', '/readyz')[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def client(client_id, port, doctors, patients, start, stop, results):
+    rng = random.Random(client_id)
+    role = 'doctor' if client_id % 4 == 3 else 'patient'
+    username = f'doc{rng.randint(1, doctors)}' if role == 'doctor' else f'pat{rng.randint(1, patients)}'
+    status, cookie = request(port, 'POST', '/login', {'username': username, 'password': PASSWORD, 'role': role})
+    if status != 302 or not cookie:
+        results.put(([], 1))
+        return
+    cookie = cookie.split(';', 1)[0]
+
+    latencies, errors = [], 0
+    start.wait()
+    while not stop.is_set():
+        method, path, form = rng.choice(PAGES[role])
+        started = time.perf_counter()
+        try:
+            status, _ = request(port, method, path, form, cookie)
+        except OSError:
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+
+def run(workers, args, database_url):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY=str(workers),
+               BIND=f'127.0.0.1:{port}', PASSWORD_HASH_METHOD=HASH_METHOD, PRELOAD_APP='1')
+    launched = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        wait_ready(port, server)
+        ready = time.perf_counter() - launched
+
+        ctx = multiprocessing.get_context('spawn')
+        start, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+        clients = [ctx.Process(target=client, args=(i, port, args.doctors, args.patients, start, stop, results))
+                   for i in range(args.clients)]
+        for p in clients:
+            p.start()
+        # Let every client log in (and every worker warm up) first
+        time.sleep(2)
+        start.set()
+        time.sleep(args.duration)
+        stop.set()
+        outcomes = [results.get() for _ in clients]
+        for p in clients:
+            p.join()
+    finally:
+        stopping = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        try:
+            _, log = server.communicate(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            raise
+        stopped = time.perf_counter() - stopping
+
+    latencies = sorted(latency for latency_list, _ in outcomes for latency in latency_list)
+    errors = sum(e for _, e in outcomes)
+    if server.returncode != 0:
+        print(log, file=sys.stderr)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / args.duration,
+        'p50': statistics.median(latencies) * 1000 if latencies else float('nan'),
+        'p95': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan'),
+        'errors': errors,
+        'ready': ready,
+        'stopped': stopped,
+        'clean_exit': server.returncode == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=20000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    database_url = 'sqlite:///' + path
+    os.environ['DATABASE_URL'] = database_url
+    try:
+        setup_database(args.doctors, args.patients, args.appointments)
+        print(f'{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:g}s per run')
+        print(f'{"workers":>7} {"requests":>9} {"req/s":>8} {"speed-up":>8} {"p50 ms":>8} {"p95 ms":>8} '
+              f'{"errors":>6} {"ready s":>7} {"stop s":>6}')
+        baseline = None
+        failed = False
+        for workers in args.workers:
+            result = run(workers, args, database_url)
+            baseline = baseline or result['rps']
+            failed |= bool(result['errors']) or not result['clean_exit']
+            print(f'{workers:>7} {result["requests"]:>9} {result["rps"]:>8.1f} {result["rps"] / baseline:>7.2f}x '
+                  f'{result["p50"]:>8.1f} {result["p95"]:>8.1f} {result["errors"]:>6} {result["ready"]:>7.2f} '
+                  f'{result["stopped"]:>6.2f}' + ('' if result['clean_exit'] else '  (unclean exit)'))
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Set-based admin actions: one UPDATE for many appointments, doctors or patients.
+
+Each function runs a single UPDATE ... RETURNING on the session's
+connection and returns the number of rows it changed; the caller commits,
+so the whole action is one transaction. Rows already in the target state
+are left alone and not counted.
+
+Core updates skip the ORM flush events, so each function queues the same
+follow-up work they would have: cache keys, slot grid changes, roster rows, rollup days, dashboard counters
+and identity snapshots, all applied once when the transaction commits.
+"""
+from collections import Counter
+
+from sqlalchemy import or_, update
+
+from models import db, Appointment, Doctor, Patient
+from cache import invalidate_after_commit
+from dashboard_stats import apply_deltas
+from database import mark_written
+from identity import ROLES, forget_after_commit
+import rollups
+import roster
+import slots
+
+MAX_IDS = 1000
+
+# Statuses a bulk action may change, per target status (as for a single
+# appointment, an Expired one can still be completed or cancelled)
+_FROM_STATUSES = {
+    'Completed': ('Booked', 'Expired'),
+    'Cancelled': ('Booked', 'Expired'),
+}
+
+_ACTIVE_COUNTERS = {Doctor: 'active_doctors', Patient: 'active_patients'}
+
+
+def _appointments_changed(rows, status):
+    if not rows:
+        return 0
+    session = db.session
+    connection = session.connection()
+    invalidate_after_commit(session, [Appointment])
+    # Every row was Booked or Expired; freeing a slot outside the grid is a no-op
+    slots.adjust_after_commit(session, [(-1, r.doctor_id, r.date, r.time) for r in rows])
+    if status == 'Cancelled':
+        # Completing keeps a visit in the roster; cancelling takes it out
+        roster.subtract_visits(connection, Counter((r.doctor_id, r.patient_id) for r in rows))
+    rollups.mark_days(connection, {r.date for r in rows})
+    mark_written(session)
+    return len(rows)
+
+
+def _update_appointments(status, from_statuses, *criteria):
+    appointment = Appointment.__table__
+    rows = db.session.connection().execute(
+        update(appointment)
+        .where(appointment.c.status.in_(from_statuses), *criteria)
+        .values(status=status)
+        .returning(appointment.c.doctor_id, appointment.c.patient_id, appointment.c.date, appointment.c.time)
+    ).all()
+    return _appointments_changed(rows, status)
+
+
+def set_appointment_status(ids, status):
+    return _update_appointments(status, _FROM_STATUSES[status], Appointment.__table__.c.id.in_(ids))
+
+
+def cancel_doctor_appointments(doctor_id, start, end):
+    # Every Booked appointment of the doctor from start to end inclusive
+    appointment = Appointment.__table__
+    return _update_appointments('Cancelled', ('Booked',), appointment.c.doctor_id == doctor_id,
+                                appointment.c.date.between(start, end))
+
+
+def set_active(model, ids, active):
+    table = model.__table__
+    if active:
+        changing = table.c.is_active == False
+    else:
+        # An unset is_active counts as active
+        changing = or_(table.c.is_active == True, table.c.is_active.is_(None))
+    changed = db.session.connection().execute(
+        update(table).where(table.c.id.in_(ids), changing).values(is_active=active).returning(table.c.id)
+    ).scalars().all()
+    if not changed:
+        return 0
+
+    session = db.session
+    invalidate_after_commit(session, [model])
+    forget_after_commit(session, {(ROLES[model], i) for i in changed})
+    apply_deltas(session.connection(), {_ACTIVE_COUNTERS[model]: len(changed) if active else -len(changed)})
+    if model is Doctor:
+        slots.rebuild_after_commit(session)
+    mark_written(session)
+    return len(changed)
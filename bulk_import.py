@@ -0,0 +1,387 @@
+"""Stream doctors, patients or historical appointments into the database.
+
+Usage:
+    python bulk_import.py doctors FILE [options]
+    python bulk_import.py patients FILE [options]
+    python bulk_import.py appointments FILE [options]
+
+Options:
+    --format csv|jsonl   input format (default: from the file extension)
+    --batch-size N       rows per INSERT batch (default 1000)
+    --commit-every N     batches per transaction (default 10)
+    --restart            ignore any saved checkpoint and start from the top
+
+FILE is read one row at a time, so memory stays flat however large it is.
+Rows that fail validation (or hit a unique constraint) are written to
+FILE.rejects.jsonl with their line number and the reason. The number of the
+last imported line is stored in the import_checkpoint table in the same
+transaction as the rows themselves, so re-running after a crash resumes
+exactly where the last commit left off.
+
+Columns:
+    doctors:      username, name, email, specialization, department (name or id),
+                  password or password_hash, [phone, experience, is_active]
+    patients:     username, name, email, password or password_hash,
+                  [phone, age, gender, address, is_active, is_blacklisted]
+    appointments: patient (username), doctor (username), date (YYYY-MM-DD),
+                  time (HH:MM), [status, reason, diagnosis, prescription, notes]
+                  A treatment is created for rows with a diagnosis.
+"""
+import argparse
+import csv
+from abc import ABC, abstractmethod
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from models import db, Doctor, Patient, Appointment, Treatment, Department, ImportCheckpoint
+from passwords import hash_passwords
+from dashboard_stats import reconcile
+import roster
+import rollups
+
+STATUSES = ('Booked', 'Completed', 'Cancelled', 'Expired')
+# SQLite's default limit on bound parameters per statement
+MAX_VARIABLES = 999
+
+
+def read_rows(path, fmt):
+    # A line that is not a JSON object comes through as a ValueError, so it
+    # is rejected like any other invalid row instead of stopping the import
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            # Header is line 1, so data starts on line 2
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = ValueError(f'invalid JSON: {e.msg}')
+                else:
+                    if not isinstance(row, dict):
+                        row = ValueError(f'expected a JSON object, not {type(row).__name__}')
+                yield line_no, row
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Validation helpers: each returns the cleaned value or raises ValueError.
+# JSONL values may be any JSON type; types lists what a field accepts.
+
+def optional(row, field, types=(str,)):
+    value = row.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == '':
+        return None
+    if not isinstance(value, types):
+        raise ValueError(f'{field} must be {" or ".join(t.__name__ for t in types)}, not {type(value).__name__}')
+    return value
+
+
+def required(row, field, types=(str,)):
+    value = optional(row, field, types)
+    if value is None:
+        raise ValueError(f'missing {field}')
+    return value
+
+
+def non_negative_int(row, field):
+    value = optional(row, field, (str, int))
+    if value is None:
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f'{field} cannot be negative')
+    return value
+
+
+def flag(row, field, default):
+    value = optional(row, field, (str, int, bool))
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'y')
+
+
+def credentials(row):
+    password_hash = optional(row, 'password_hash')
+    if password_hash:
+        return password_hash, None
+    return None, required(row, 'password')
+
+
+class Importer(ABC):
+    model = None
+
+    def __init__(self):
+        self.rejects = []
+
+    @abstractmethod
+    def validate(self, row):
+        # Returns the row to insert, or raises ValueError
+        ...
+
+    def prepare(self, rows):
+        # Resolve references / hash passwords for a whole batch at once
+        return rows
+
+    def insert(self, rows):
+        db.session.execute(insert(self.model.__table__), rows)
+
+
+class PersonImporter(Importer):
+    def prepare(self, rows):
+        plain = [r for r in rows if r['password_hash'] is None]
+        hashes = hash_passwords([r.pop('_password') for r in plain])
+        for row, password_hash in zip(plain, hashes):
+            row['password_hash'] = password_hash
+        for row in rows:
+            row.pop('_password', None)
+        return rows
+
+
+class DoctorImporter(PersonImporter):
+    model = Doctor
+
+    def __init__(self):
+        super().__init__()
+        self.departments = {}
+        for dept in Department.query.all():
+            self.departments[str(dept.id)] = dept.id
+            self.departments[dept.name.lower()] = dept.id
+
+    def validate(self, row):
+        password_hash, password = credentials(row)
+        department = str(required(row, 'department', (str, int))).lower()
+        if department not in self.departments:
+            raise ValueError(f'unknown department {row["department"]!r}')
+        return {
+            'username': required(row, 'username'),
+            'name': required(row, 'name'),
+            'email': required(row, 'email'),
+            'specialization': required(row, 'specialization'),
+            'department_id': self.departments[department],
+            'phone': optional(row, 'phone'),
+            'experience': non_negative_int(row, 'experience') or 0,
+            'is_active': flag(row, 'is_active', True),
+            'password_hash': password_hash,
+            '_password': password,
+        }
+
+
+class PatientImporter(PersonImporter):
+    model = Patient
+
+    def validate(self, row):
+        password_hash, password = credentials(row)
+        return {
+            'username': required(row, 'username'),
+            'name': required(row, 'name'),
+            'email': required(row, 'email'),
+            'phone': optional(row, 'phone'),
+            'age': non_negative_int(row, 'age'),
+            'gender': optional(row, 'gender'),
+            'address': optional(row, 'address'),
+            'is_active': flag(row, 'is_active', True),
+            'is_blacklisted': flag(row, 'is_blacklisted', False),
+            'password_hash': password_hash,
+            '_password': password,
+        }
+
+
+class AppointmentImporter(Importer):
+    model = Appointment
+
+    def validate(self, row):
+        status = optional(row, 'status') or 'Completed'
+        if status not in STATUSES:
+            raise ValueError(f'status must be one of {", ".join(STATUSES)}')
+        appointment_time = required(row, 'time')
+        return {
+            'patient': required(row, 'patient'),
+            'doctor': required(row, 'doctor'),
+            'date': datetime.strptime(required(row, 'date'), '%Y-%m-%d').date(),
+            'time': datetime.strptime(appointment_time, '%H:%M:%S' if appointment_time.count(':') == 2 else '%H:%M').time(),
+            'status': status,
+            'reason': optional(row, 'reason'),
+            'diagnosis': optional(row, 'diagnosis'),
+            'prescription': optional(row, 'prescription'),
+            'notes': optional(row, 'notes'),
+        }
+
+    @staticmethod
+    def lookup_ids(model, usernames):
+        ids = {}
+        usernames = list(usernames)
+        for start in range(0, len(usernames), MAX_VARIABLES):
+            chunk = usernames[start:start + MAX_VARIABLES]
+            ids.update(db.session.query(model.username, model.id).filter(model.username.in_(chunk)).all())
+        return ids
+
+    def prepare(self, rows):
+        patients = self.lookup_ids(Patient, {r['patient'] for r in rows})
+        doctors = self.lookup_ids(Doctor, {r['doctor'] for r in rows})
+        prepared = []
+        for row in rows:
+            if row['patient'] not in patients:
+                self.rejects.append((row['_line'], f'unknown patient {row["patient"]!r}'))
+            elif row['doctor'] not in doctors:
+                self.rejects.append((row['_line'], f'unknown doctor {row["doctor"]!r}'))
+            else:
+                row['patient_id'] = patients[row['patient']]
+                row['doctor_id'] = doctors[row['doctor']]
+                prepared.append(row)
+        return prepared
+
+    def insert(self, rows):
+        appointment_cols = ('patient_id', 'doctor_id', 'date', 'time', 'status', 'reason')
+        table = Appointment.__table__
+        result = db.session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [{col: row[col] for col in appointment_cols} for row in rows]
+        )
+        treatments = [
+            {'appointment_id': appointment_id, 'diagnosis': row['diagnosis'],
+             'prescription': row['prescription'], 'notes': row['notes']}
+            for appointment_id, row in zip(result.scalars(), rows) if row['diagnosis']
+        ]
+        if treatments:
+            db.session.execute(insert(Treatment.__table__), treatments)
+
+
+IMPORTERS = {
+    'doctors': DoctorImporter,
+    'patients': PatientImporter,
+    'appointments': AppointmentImporter,
+}
+
+
+def insert_batch(importer, rows):
+    # Fast path: one executemany. If a unique constraint trips, redo the
+    # batch row by row so only the offending rows are rejected.
+    if not rows:
+        return 0
+    try:
+        with db.session.begin_nested():
+            importer.insert([strip_private(r) for r in rows])
+        return len(rows)
+    except IntegrityError:
+        pass
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                importer.insert([strip_private(row)])
+            inserted += 1
+        except IntegrityError as e:
+            importer.rejects.append((row['_line'], f'constraint violation: {e.orig}'))
+    return inserted
+
+
+def strip_private(row):
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+
+def write_rejects(path, rejects):
+    with open(path, 'a', encoding='utf-8') as f:
+        for line_no, reason in rejects:
+            f.write(json.dumps({'line': line_no, 'error': reason}) + '\n')
+
+
+def run_import(kind, path, fmt=None, batch_size=1000, commit_every=10, restart=False):
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+    source = f'{kind}:{os.path.abspath(path)}'
+    rejects_path = path + '.rejects.jsonl'
+    importer = IMPORTERS[kind]()
+
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source, line=0)
+        db.session.add(checkpoint)
+    if restart:
+        checkpoint.line = 0
+    resume_after = checkpoint.line
+    if resume_after:
+        print(f'Resuming {source} after line {resume_after}')
+
+    rows = ((n, r) for n, r in read_rows(path, fmt) if n > resume_after)
+    total = rejected = 0
+    started = time.perf_counter()
+    for batch_no, batch in enumerate(batched(rows, batch_size), start=1):
+        batch_start = time.perf_counter()
+        valid = []
+        for line_no, raw in batch:
+            try:
+                if isinstance(raw, ValueError):
+                    raise raw
+                row = importer.validate(raw)
+            except (ValueError, TypeError) as e:
+                importer.rejects.append((line_no, str(e)))
+                continue
+            row['_line'] = line_no
+            valid.append(row)
+
+        inserted = insert_batch(importer, importer.prepare(valid))
+        checkpoint.line = batch[-1][0]
+        if batch_no % commit_every == 0:
+            db.session.commit()
+
+        total += inserted
+        rejected += len(importer.rejects)
+        write_rejects(rejects_path, importer.rejects)
+        importer.rejects = []
+        elapsed = time.perf_counter() - batch_start
+        print(f'batch {batch_no}: {inserted} rows, {len(batch) - inserted} rejected, '
+              f'{inserted / elapsed:.0f} rows/s (up to line {checkpoint.line})')
+
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f'Imported {total} {kind} in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s), '
+          f'{rejected} rejected' + (f' (see {rejects_path})' if rejected else ''))
+
+    # Raw inserts bypass the ORM events that maintain the dashboard counters
+    reconcile(verbose=False)
+    if kind == 'appointments':
+        roster.rebuild(verbose=False)
+        rollups.rebuild(verbose=False)
+    return total, rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream a CSV/JSONL file into the database.')
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--commit-every', type=int, default=10)
+    parser.add_argument('--restart', action='store_true')
+    args = parser.parse_args(argv)
+
+    app = create_app({'BLUEPRINTS': []})
+    with app.app_context():
+        db.create_all()
+        run_import(args.kind, args.file, args.format, args.batch_size, args.commit_every, args.restart)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
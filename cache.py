@@ -0,0 +1,188 @@
+"""Small shared cache for query results that are the same for every user.
+
+The default backend is an in-process TTL + LRU dict. Any object with
+get(key) -> value or None, set(key, value, ttl) and delete(key) can be
+plugged in instead (e.g. a thin Redis wrapper) via CACHE_BACKEND, which also
+makes invalidation visible to every worker process. CACHE_BACKEND is either
+the backend itself or, e.g. from the environment, "module:factory" naming a
+callable that returns one. Values must be plain data (dicts, lists, dates),
+not ORM objects.
+
+invalidate_on_commit() ties cache keys to models: when a transaction that
+inserted, updated or deleted one of those models commits, the keys are
+dropped. data_version(name) is a token kept in the backend until its
+VERSION_PREFIX key is dropped that way (slots.py registers one per table
+it is built from); with a shared backend every process sees it move.
+
+The in-process backend only sees this process's own commits. With
+LOCAL_CACHES=0 (set by gunicorn.conf.py for several workers without a
+CACHE_BACKEND) it is replaced by NullBackend, which stores nothing.
+"""
+import importlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import use_primary
+
+
+class TTLLRUBackend:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+VERSION_PREFIX = 'version:'
+
+
+def load_backend(spec):
+    module, _, factory = spec.partition(':')
+    return getattr(importlib.import_module(module), factory)()
+
+
+class Cache:
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend or TTLLRUBackend()
+        # Whether other processes see the same entries (and invalidations)
+        self.shared = backend is not None
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._invalidations = []
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CACHE_TTL', self.ttl)
+        backend = app.config.get('CACHE_BACKEND')
+        if isinstance(backend, str):
+            backend = load_backend(backend)
+        if backend is not None:
+            self.backend = backend
+            self.shared = True
+        elif not app.config.get('LOCAL_CACHES', True):
+            self.backend = NullBackend()
+        elif 'CACHE_MAXSIZE' in app.config:
+            self.backend = TTLLRUBackend(app.config['CACHE_MAXSIZE'])
+
+    def get_or_set(self, key, load, ttl=None):
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        # A lagging replica could bring back what a commit just invalidated
+        with use_primary():
+            value = load()
+        self.backend.set(key, value, ttl or self.ttl)
+        return value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+
+    def data_version(self, table):
+        # (created, nonce); the nonce tells apart tokens created in the same instant
+        version = self.backend.get(VERSION_PREFIX + table)
+        if version is None:
+            version = (time.time(), uuid.uuid4().hex[:8])
+            self.backend.set(VERSION_PREFIX + table, version)
+        return version
+
+    def invalidate_on_commit(self, models, keys):
+        # keys is a callable so date-based keys are computed at commit time
+        self._invalidations.append((tuple(models), keys))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+        if hasattr(self.backend, '__len__'):
+            stats['size'] = len(self.backend)
+        return stats
+
+    def keys_for(self, classes):
+        keys = set()
+        for models, key_fn in self._invalidations:
+            if any(issubclass(cls, models) for cls in classes):
+                keys.update(key_fn())
+        return keys
+
+
+cache = Cache()
+
+
+def invalidate_after_commit(session, classes):
+    # Queue the keys registered for these models; also for Core writers,
+    # which skip the listeners below
+    keys = cache.keys_for(classes)
+    if keys:
+        session.info.setdefault('cache_keys', set()).update(keys)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_cache_keys(session, flush_context, instances):
+    touched = list(session.new) + list(session.dirty) + list(session.deleted)
+    invalidate_after_commit(session, {type(obj) for obj in touched})
+
+
+# Query.update()/delete() skip the flush, so check their target mapper too
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_cache_keys(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        invalidate_after_commit(orm_execute_state.session,
+                                {m.class_ for m in orm_execute_state.all_mappers})
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_cache_keys(session):
+    cache.delete(*session.info.pop('cache_keys', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_cache_keys(session):
+    session.info.pop('cache_keys', None)
@@ -0,0 +1,31 @@
+"""Settings for create_app() (see app.py), read from the environment.
+
+create_app({'KEY': value, ...}) overrides any of them, e.g.
+create_app({'BLUEPRINTS': []}) for scripts that only need the models and
+the write-side bookkeeping, not the views.
+"""
+import os
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///hospital.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Role blueprints to register: any of admin, doctor, patient. Each one's
+    # views (and what only they use) are imported only when it is listed
+    BLUEPRINTS = [name for name in os.environ.get('APP_BLUEPRINTS', 'admin,doctor,patient').split(',') if name]
+    # Password hashing (see passwords.py); existing hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    # Statements slower than this are written to the "slow_query" log
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    # Cache shared by every process, as "module:factory" (see cache.py); the
+    # dashboard fragments are then kept there too
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or None
+    # Per-process caches (listings, user snapshots, the slot grid) only see
+    # this process's commits: set 0 when several processes serve the same
+    # database without a shared CACHE_BACKEND (gunicorn.conf.py does)
+    LOCAL_CACHES = os.environ.get('LOCAL_CACHES', '1').lower() not in ('0', 'false', 'no')
+    # Logged-in user snapshots (see identity.py); the TTL bounds staleness across worker processes
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 1024))
+    IDENTITY_TTL = int(os.environ.get('IDENTITY_TTL', 30))
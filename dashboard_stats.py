@@ -0,0 +1,143 @@
+"""Incrementally maintained counters for the admin dashboard.
+
+The stat_counter table holds one row per counter. Every ORM flush that adds,
+removes or (de)activates a doctor or patient, or adds/removes an appointment,
+bumps the matching rows inside the same transaction, so the dashboard reads
+three primary-key lookups instead of three COUNT(*) scans.
+
+Writes that bypass the ORM (raw SQL, Query.update/delete) are not seen;
+reconcile() recomputes every counter and reports any drift.
+
+Usage: python dashboard_stats.py [--interval SECONDS]
+"""
+import sys
+import time
+
+from sqlalchemy import event, or_, update
+from sqlalchemy.orm import Session
+
+from database import use_primary
+from models import db, Doctor, Patient, Appointment, ArchivedAppointment, StatCounter
+
+
+def _active(model):
+    # is_active defaults to True, so an unset value counts as active (as in
+    # _is_active below and in login_required)
+    return or_(model.is_active == True, model.is_active.is_(None))
+
+
+COUNTERS = {
+    'active_doctors': lambda: Doctor.query.filter(_active(Doctor)).count(),
+    'active_patients': lambda: Patient.query.filter(_active(Patient)).count(),
+    # Archiving moves rows between tiers without changing the total
+    'appointments': lambda: Appointment.query.count() + ArchivedAppointment.query.count(),
+}
+
+_ACTIVE_COUNTERS = {Doctor: 'active_doctors', Patient: 'active_patients'}
+
+
+def _is_active(value):
+    # is_active defaults to True, so an unset value counts as active
+    return value is not False
+
+
+def _flush_deltas(session):
+    deltas = dict.fromkeys(COUNTERS, 0)
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            deltas['appointments'] += 1
+        elif type(obj) in _ACTIVE_COUNTERS and _is_active(obj.is_active):
+            deltas[_ACTIVE_COUNTERS[type(obj)]] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            deltas['appointments'] -= 1
+        elif type(obj) in _ACTIVE_COUNTERS and _is_active(obj.is_active):
+            deltas[_ACTIVE_COUNTERS[type(obj)]] -= 1
+    for obj in session.dirty:
+        if type(obj) not in _ACTIVE_COUNTERS:
+            continue
+        history = db.inspect(obj).attrs.is_active.history
+        if not history.has_changes():
+            continue
+        was_active = _is_active(history.deleted[0]) if history.deleted else True
+        now_active = _is_active(obj.is_active)
+        if was_active != now_active:
+            deltas[_ACTIVE_COUNTERS[type(obj)]] += 1 if now_active else -1
+    return {name: delta for name, delta in deltas.items() if delta}
+
+
+def apply_deltas(connection, deltas):
+    # Also used by writers that bypass the flush (see bulk_actions.py)
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(StatCounter.__table__)
+                .where(StatCounter.__table__.c.name == name)
+                .values(value=StatCounter.__table__.c.value + delta)
+            )
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_counters(session, flush_context):
+    apply_deltas(session.connection(), _flush_deltas(session))
+
+
+def _stored_counters():
+    return dict(db.session.query(StatCounter.name, StatCounter.value).filter(
+        StatCounter.name.in_(list(COUNTERS))
+    ).all())
+
+
+def get_counters():
+    values = _stored_counters()
+    if set(values) != set(COUNTERS):
+        # First use on this database: seed the counters
+        with use_primary():
+            reconcile(verbose=False)
+            values = _stored_counters()
+    return values
+
+
+def reconcile(verbose=True):
+    # Returns {name: (stored, actual)} for every counter that had drifted
+    with use_primary():
+        return _reconcile(verbose)
+
+
+def _reconcile(verbose):
+    drift = {}
+    stored = _stored_counters()
+    for name, count in COUNTERS.items():
+        actual = count()
+        if stored.get(name) != actual:
+            drift[name] = (stored.get(name), actual)
+            counter = db.session.get(StatCounter, name) or StatCounter(name=name)
+            counter.value = actual
+            db.session.add(counter)
+    db.session.commit()
+
+    if verbose:
+        for name in COUNTERS:
+            if name in drift:
+                before, actual = drift[name]
+                print(f'{name}: stored {before}, actual {actual} (fixed)')
+            else:
+                print(f'{name}: ok')
+    return drift
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    interval = None
+    if '--interval' in sys.argv:
+        interval = float(sys.argv[sys.argv.index('--interval') + 1])
+
+    with app.app_context():
+        while True:
+            reconcile()
+            if interval is None:
+                break
+            db.session.remove()
+            time.sleep(interval)
@@ -0,0 +1,58 @@
+"""Per-table data versions, kept in the database so every process sees them.
+
+The data_version table holds one counter per table. The first INSERT,
+UPDATE or DELETE on a table in a transaction also bumps that table's
+counter, on the same connection and inside the same transaction. This
+covers ORM flushes, Query.update/delete and Core writers alike (SQL
+written as text() is not seen). So every worker process, api.py and the
+CLI jobs read the new version as soon as the write commits, and never
+one for a write that rolled back.
+
+read() goes through db.session, so a view that reads from a replica also
+gets that replica's versions (see fragments.py).
+
+A bump holds the counter row until commit. On PostgreSQL or MySQL that
+serializes writers to the same table; SQLite serializes every writer
+anyway.
+"""
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+from models import db, DataVersion
+
+_versions = DataVersion.__table__
+
+
+def bump(connection, table):
+    if not connection.execute(
+        update(_versions).where(_versions.c.table_name == table).values(version=_versions.c.version + 1)
+    ).rowcount:
+        connection.execute(insert(_versions).values(table_name=table, version=1))
+
+
+def read(tables=None):
+    # {table: version}; a table that was never written has no entry (version 0)
+    query = select(_versions.c.table_name, _versions.c.version)
+    if tables is not None:
+        query = query.where(_versions.c.table_name.in_(tables))
+    return dict(db.session.execute(query).all())
+
+
+@event.listens_for(Engine, 'after_execute')
+def _bump_written_table(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+    table = clauseelement.table.name
+    bumped = conn.info.setdefault('bumped_versions', set())
+    # bump()'s own statements come through here too
+    if table != _versions.name and table not in bumped:
+        bumped.add(table)
+        bump(conn, table)
+
+
+# Once per transaction; a savepoint rolled back takes its bumps with it
+@event.listens_for(Engine, 'begin')
+@event.listens_for(Engine, 'rollback_savepoint')
+def _forget_bumped(conn, *args):
+    conn.info.pop('bumped_versions', None)
@@ -0,0 +1,143 @@
+"""Engine settings from the environment and read/write session routing.
+
+Pool settings are only passed to the engine when set:
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds),
+    DB_POOL_RECYCLE (seconds), DB_POOL_PRE_PING (1/0)
+
+DATABASE_REPLICA_URLS is a comma-separated list of read replicas, added as
+the binds replica_0, replica_1, ... db.session (a RoutingSession) sends
+SELECTs to one of them, picked once per session, but only inside views
+decorated with @replica_reads, and only until the session has flushed a
+write. After a request commits a write, the same browser reads from the
+primary for READ_YOUR_WRITES_SECONDS, so users always see their own
+changes even while the replica lags. Everything else (writes, Core
+statements on db.session.connection(), CLI jobs) uses the primary.
+
+Anything that fills a cache shared between users should read inside
+use_primary(), or a lagging replica could put back what a commit has just
+invalidated, and so should any job that decides what to write from what
+it reads (rollups.catch_up, dashboard_stats.reconcile): a replica that
+has not yet seen the job's own commits would send it round in circles.
+
+Pooled connections must not cross fork(): servers that fork workers from a
+preloaded app call dispose_engines(app, close=False) in each new worker
+(see gunicorn.conf.py).
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session as browser_session
+from flask_sqlalchemy.session import Session as BindSession
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+PRIMARY_UNTIL = '_primary_until'
+
+_POOL_SETTINGS = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda v: v.lower() in ('1', 'true', 'yes')),
+}
+
+
+def engine_options(environ=os.environ):
+    return {option: convert(environ[name])
+            for name, (option, convert) in _POOL_SETTINGS.items() if environ.get(name)}
+
+
+def replica_binds(environ=os.environ):
+    urls = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+def configure_engines(app, environ=os.environ):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(environ)
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(environ)
+    app.config['READ_YOUR_WRITES_SECONDS'] = float(environ.get('READ_YOUR_WRITES_SECONDS', 10))
+
+
+def dispose_engines(app, close=True):
+    # After fork() pass close=False: the pooled connections the child
+    # inherited still belong to the parent, so the child only forgets them
+    # and opens its own. On shutdown close=True closes this process's.
+    with app.app_context():
+        for engine in app.extensions['sqlalchemy'].engines.values():
+            engine.dispose(close=close)
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('replica_reads', False)
+    g.replica_reads = False
+    try:
+        yield
+    finally:
+        g.replica_reads = previous
+
+
+def _reads_primary_only():
+    return browser_session.get(PRIMARY_UNTIL, 0) > time.time()
+
+
+class RoutingSession(BindSession):
+    def _replica(self):
+        keys = [key for key in self._db.engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+        if not keys:
+            return None
+        if self.info.get('replica') not in keys:
+            self.info['replica'] = random.choice(keys)
+        return self._db.engines[self.info['replica']]
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and has_request_context()
+                and g.get('replica_reads') and not self.info.get('wrote') and not _reads_primary_only()):
+            replica = self._replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def mark_written(session):
+    # Send this browser to the primary once the transaction commits
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    mark_written(session)
+
+
+# Query.update()/delete() write without a flush
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_written(orm_execute_state.session)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _start_read_your_writes(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        browser_session[PRIMARY_UNTIL] = time.time() + current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
@@ -0,0 +1,210 @@
+"""Doctor views: dashboard, availability, treatments and patient history."""
+from datetime import datetime, timedelta, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, g
+from sqlalchemy.orm import joinedload
+
+from models import db, Patient, Appointment, Treatment, DoctorAvailability, AvailabilityTemplate, DoctorPatient
+from archive import read_both
+from auth_views import login_required
+from database import replica_reads
+from fragments import caches_fragments
+from pagination import keyset_page
+import availability
+
+bp = Blueprint('doctor', __name__, url_prefix='/doctor')
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+@bp.route('/dashboard')
+@login_required(role='doctor')
+@replica_reads
+@caches_fragments
+def doctor_dashboard():
+    doctor_id = session.get('user_id')
+    doctor = g.principal
+    
+    # Upcoming appointments for next 7 days
+    today = date.today()
+    next_week = today + timedelta(days=7)
+    
+    upcoming_appointments = Appointment.query.options(
+        joinedload(Appointment.patient)
+    ).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.date >= today,
+        Appointment.date <= next_week,
+        Appointment.status == 'Booked'
+    ).order_by(Appointment.date, Appointment.time).all()
+    
+    # Patients assigned to doctor, most recently seen first (see roster.py)
+    roster_page = keyset_page(
+        DoctorPatient.query.options(joinedload(DoctorPatient.patient)).filter(
+            DoctorPatient.doctor_id == doctor_id
+        ),
+        [DoctorPatient.last_seen, DoctorPatient.patient_id], descending=True, prefix='patients_'
+    )
+    
+    return render_template('doctor_dashboard.html',
+                         doctor=doctor,
+                         upcoming_appointments=upcoming_appointments,
+                         roster=roster_page.items,
+                         roster_page=roster_page)
+
+@bp.route('/appointment/<int:appointment_id>/cancel', methods=['GET', 'POST'])
+@login_required(role='doctor')
+def doctor_cancel_appointment(appointment_id):
+    appt = Appointment.query.get_or_404(appointment_id)
+
+    # ensure this appointment belongs to the logged‑in doctor
+    if not appt.is_owned_by(session.get('role'), session.get('user_id')):
+        flash('You are not allowed to modify this appointment.', 'danger')
+        return redirect(url_for('doctor.doctor_dashboard'))
+
+    appt.status = 'Cancelled'
+    db.session.commit()
+    flash('Appointment cancelled.', 'success')
+    return redirect(url_for('doctor.doctor_dashboard'))
+
+
+@bp.route('/availability', methods=['GET', 'POST'])
+@login_required(role='doctor')
+def doctor_availability():
+    doctor_id = session.get('user_id')
+
+    if request.method == 'POST':
+        today = date.today()
+
+        # Read values from the form; only the days that changed are written
+        wanted = {}
+        for i in range(availability.WINDOW_DAYS):
+            availability_date = today + timedelta(days=i)
+            date_str = availability_date.strftime('%Y-%m-%d')
+
+            is_available = request.form.get(f'available_{date_str}') == 'yes'
+            start_time = request.form.get(f'start_time_{date_str}')
+            end_time = request.form.get(f'end_time_{date_str}')
+
+            if is_available and start_time and end_time:
+                wanted[availability_date] = (datetime.strptime(start_time, '%H:%M').time(),
+                                             datetime.strptime(end_time, '%H:%M').time())
+
+        availability.save_week(doctor_id, wanted, today)
+        db.session.commit()
+        return redirect(url_for('doctor.doctor_dashboard'))
+
+    # GET: show form
+    today = date.today()
+    next_week = today + timedelta(days=7)
+    availabilities = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date >= today,
+        DoctorAvailability.date <= next_week
+    ).all()
+
+    availability_dict = {avail.date: avail for avail in availabilities}
+    days = [(today + timedelta(days=i)) for i in range(7)]
+    templates = {t.weekday: t for t in AvailabilityTemplate.query.filter_by(doctor_id=doctor_id)}
+
+    return render_template(
+        'doctor_availability.html',
+        availability_dict=availability_dict,
+        days=days,
+        templates=templates,
+        weekdays=WEEKDAYS
+    )
+
+@bp.route('/availability/template', methods=['POST'])
+@login_required(role='doctor')
+def doctor_availability_template():
+    doctor_id = session.get('user_id')
+
+    wanted = {}
+    for weekday in range(7):
+        start_time = request.form.get(f'template_start_{weekday}')
+        end_time = request.form.get(f'template_end_{weekday}')
+        if request.form.get(f'template_{weekday}') == 'yes' and start_time and end_time:
+            wanted[weekday] = (datetime.strptime(start_time, '%H:%M').time(),
+                               datetime.strptime(end_time, '%H:%M').time())
+
+    availability.save_templates(doctor_id, wanted, date.today())
+    db.session.commit()
+    flash('Weekly hours saved', 'success')
+    return redirect(url_for('doctor.doctor_availability'))
+
+
+
+@bp.route('/mark_appointment/<int:appointment_id>/<status>')
+@login_required(role='doctor')
+def mark_appointment(appointment_id, status):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    
+    if not appointment.is_owned_by(session.get('role'), session.get('user_id')):
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('doctor.doctor_dashboard'))
+    
+    if status in Appointment.MARKABLE_STATUSES:
+        appointment.status = status
+        db.session.commit()
+        flash(f'Appointment marked as {status}', 'success')
+    
+    return redirect(url_for('doctor.doctor_dashboard'))
+
+@bp.route('/update_treatment/<int:appointment_id>', methods=['GET', 'POST'])
+@login_required(role='doctor')
+def update_treatment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    
+    if not appointment.is_owned_by(session.get('role'), session.get('user_id')):
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('doctor.doctor_dashboard'))
+    
+    if request.method == 'POST':
+        diagnosis = request.form.get('diagnosis')
+        prescription = request.form.get('prescription')
+        notes = request.form.get('notes')
+        
+        # Check if treatment already exists
+        treatment = Treatment.query.filter_by(appointment_id=appointment_id).first()
+        
+        if treatment:
+            treatment.diagnosis = diagnosis
+            treatment.prescription = prescription
+            treatment.notes = notes
+        else:
+            treatment = Treatment(
+                appointment_id=appointment_id,
+                diagnosis=diagnosis,
+                prescription=prescription,
+                notes=notes
+            )
+            db.session.add(treatment)
+        
+        # Mark appointment as completed
+        appointment.status = 'Completed'
+        db.session.commit()
+        
+        flash('Treatment updated successfully', 'success')
+        return redirect(url_for('doctor.doctor_dashboard'))
+    
+    treatment = Treatment.query.filter_by(appointment_id=appointment_id).first()
+    return render_template('update_treatment.html', appointment=appointment, treatment=treatment)
+
+@bp.route('/patient_history/<int:patient_id>')
+@login_required(role='doctor')
+@replica_reads
+def doctor_patient_history(patient_id):
+    doctor_id = session.get('user_id')
+    patient = Patient.query.get_or_404(patient_id)
+    
+    # Get all completed appointments with treatments for this patient with this doctor
+    appointments = read_both(lambda model: model.query.options(
+        joinedload(model.doctor),
+        joinedload(model.treatment)
+    ).filter(
+        model.patient_id == patient_id,
+        model.doctor_id == doctor_id,
+        model.status == 'Completed'
+    ))
+    
+    return render_template('patient_history.html', patient=patient, appointments=appointments, user_role='doctor')
@@ -0,0 +1,139 @@
+"""Stream appointments (with doctor, patient and treatment) as CSV or NDJSON.
+
+Rows are read with yield_per, so only one batch is in memory at a time, and
+written out as a generator of ~64 KB chunks, optionally gzip-compressed on
+the fly. Both the hot and the archive tables are exported.
+
+Used by /admin/export and from the command line:
+
+    python export.py [--format csv|ndjson] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+                     [--status Completed --status Cancelled] [--gzip] [-o FILE]
+
+--start/--end are inclusive; without -o the export goes to stdout.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import db, Appointment, Treatment, Doctor, Patient, ArchivedAppointment, ArchivedTreatment
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+FIELDS = ['appointment_id', 'date', 'time', 'status', 'reason', 'doctor_id', 'doctor_name',
+          'specialization', 'patient_id', 'patient_name', 'patient_email',
+          'diagnosis', 'prescription', 'notes']
+BATCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+
+def _tier_query(appointment, treatment, start, end, statuses):
+    stmt = select(
+        appointment.id.label('appointment_id'), appointment.date, appointment.time,
+        appointment.status, appointment.reason,
+        Doctor.id.label('doctor_id'), Doctor.name.label('doctor_name'), Doctor.specialization,
+        Patient.id.label('patient_id'), Patient.name.label('patient_name'), Patient.email.label('patient_email'),
+        treatment.diagnosis, treatment.prescription, treatment.notes,
+    ).join(Doctor, Doctor.id == appointment.doctor_id
+    ).join(Patient, Patient.id == appointment.patient_id
+    ).outerjoin(treatment, treatment.appointment_id == appointment.id)
+    if start:
+        stmt = stmt.where(appointment.date >= start)
+    if end:
+        stmt = stmt.where(appointment.date <= end)
+    if statuses:
+        stmt = stmt.where(appointment.status.in_(statuses))
+    return stmt.order_by(appointment.date, appointment.time, appointment.id)
+
+
+def export_rows(start=None, end=None, statuses=None):
+    # Archived rows are older, so archive first keeps the output roughly in date order
+    for appointment, treatment in ((ArchivedAppointment, ArchivedTreatment), (Appointment, Treatment)):
+        result = db.session.execute(
+            _tier_query(appointment, treatment, start, end, statuses).execution_options(yield_per=BATCH_SIZE)
+        )
+        for row in result.mappings():
+            yield row
+        result.close()
+
+
+def _values(row):
+    values = [row[f] for f in FIELDS]
+    values[1] = values[1].isoformat()
+    values[2] = values[2].strftime('%H:%M')
+    return values
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow(_values(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, _values(row)))) + '\n'
+
+
+def export_chunks(fmt='csv', start=None, end=None, statuses=None, compress=False):
+    lines = (_csv_lines if fmt == 'csv' else _ndjson_lines)(export_rows(start, end, statuses))
+    # wbits=31 writes a gzip header/trailer rather than a bare zlib stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            data = ''.join(pending).encode()
+            pending, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = ''.join(pending).encode()
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def main():
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    parser = argparse.ArgumentParser(description='Export appointments as CSV or NDJSON.')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--start', type=parse_date)
+    parser.add_argument('--end', type=parse_date)
+    parser.add_argument('--status', action='append', choices=('Booked', 'Completed', 'Cancelled', 'Expired'))
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('-o', '--output')
+    args = parser.parse_args()
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        with app.app_context():
+            for chunk in export_chunks(args.format, args.start, args.end, args.status, args.gzip):
+                out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
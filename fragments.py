@@ -0,0 +1,113 @@
+"""Template fragment caching and the Jinja bytecode cache.
+
+    {% cache "doctor_roster" on "appointment", "patient" vary doctor.id, request.args %}
+      ... expensive markup ...
+    {% endcache %}
+
+renders the block once and then serves it from the fragment cache until
+one of the tables after "on" changes. The key includes each table's
+counter from data_versions.py, which any committed write to the table
+moves in the database itself. A write made by any worker, api.py or a CLI
+job therefore moves the fragment onto a new key in every process, and old
+fragments are simply never looked up again. The values after "vary" (page
+cursors, the user, search terms) and today's date are part of the key too,
+and fragments expire after FRAGMENT_CACHE_TTL seconds.
+
+Fragments are kept in each process (up to FRAGMENT_CACHE_SIZE of them), or
+in the shared CACHE_BACKEND when one is set. Unlike the other per-process
+caches they stay on with LOCAL_CACHES=0: a stale copy is only ever stored
+under a version nobody reads any more.
+
+Views that render fragments are decorated with @caches_fragments (under
+@replica_reads), which reads the versions before the view runs its
+queries. A fragment is only stored if the versions of its tables have not
+moved by the time it renders, i.e. no write to them committed while the
+view was reading. Otherwise a render of pre-write data could be stored
+under the version that write created. Both reads go through db.session, so
+they come from the same replica as the view's data. Without the decorator
+fragments are looked up but never stored.
+
+Compiled templates are also written to JINJA_BYTECODE_CACHE_DIR (default
+instance/jinja_cache), so a freshly started worker skips the Jinja compile.
+"""
+import hashlib
+import os
+from datetime import date
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import TTLLRUBackend, cache
+import data_versions
+
+FRAGMENT_PREFIX = 'fragment:'
+
+
+def caches_fragments(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.view_data_versions = data_versions.read()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _unchanged_since_view(tables, versions):
+    if not has_request_context() or 'view_data_versions' not in g:
+        return False
+    return versions == [g.view_data_versions.get(table, 0) for table in tables]
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=TTLLRUBackend())
+
+    def _parse_list(self, parser):
+        items = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            items.append(parser.parse_expression())
+        return items
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        tables, vary = [], []
+        if parser.stream.skip_if('name:on'):
+            tables = self._parse_list(parser)
+        if parser.stream.skip_if('name:vary'):
+            vary = self._parse_list(parser)
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(tables), nodes.List(vary)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, tables, vary, caller):
+        stored = data_versions.read(tables)
+        versions = [stored.get(table, 0) for table in tables]
+        key = hashlib.sha1(repr((tables, versions, vary, date.today())).encode()).hexdigest()
+        key = f'{FRAGMENT_PREFIX}{name}:{key}'
+        fragments = self.environment.fragment_cache
+        html = fragments.get(key)
+        if html is not None:
+            cache.hits += 1
+            return Markup(html)
+        cache.misses += 1
+        html = caller()
+        if _unchanged_since_view(tables, versions):
+            fragments.set(key, str(html), current_app.config.get('FRAGMENT_CACHE_TTL', cache.ttl))
+        return html
+
+
+def init_fragments(app):
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if cache.shared:
+        app.jinja_env.fragment_cache = cache.backend
+    else:
+        app.jinja_env.fragment_cache = TTLLRUBackend(app.config.get('FRAGMENT_CACHE_SIZE', 1024))
@@ -0,0 +1,71 @@
+"""gunicorn settings for serving wsgi:app in production.
+
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment:
+    BIND / PORT         listen address (default 0.0.0.0:$PORT, PORT 8000)
+    WEB_CONCURRENCY     worker processes (default 2 x CPUs + 1)
+    WEB_THREADS         threads per worker (default 1)
+    PRELOAD_APP         build the app once in the master and fork workers
+                        from it (default 1): faster worker starts and
+                        copy-on-write sharing of the imported code
+    WORKER_TIMEOUT      seconds before a stuck worker is killed (default 30)
+    GRACEFUL_TIMEOUT    seconds a stopping worker gets to finish its
+                        requests after SIGTERM or a HUP reload (default 30)
+    MAX_REQUESTS        recycle each worker after about this many requests
+                        (default 0, never)
+    ACCESS_LOG          access log file, "-" for stdout (default off)
+    CACHE_BACKEND       shared cache, "module:factory" (see cache.py)
+
+Every worker is a separate process with its own in-process caches (cached
+listings, logged-in user snapshots, the slot grid), and a commit only
+invalidates the copies in the worker that made it. So with more than one
+worker and no CACHE_BACKEND, LOCAL_CACHES defaults to 0: those caches are
+switched off and every request reads the database (dashboard fragments
+stay cached, see fragments.py). Set a CACHE_BACKEND to keep them, or
+LOCAL_CACHES=1 to accept up to IDENTITY_TTL / CACHE_TTL / 60 seconds of
+staleness between workers.
+
+On SIGTERM or SIGINT workers stop accepting, finish the requests they have
+within GRACEFUL_TIMEOUT, then close their database connections and
+password-hashing pool (worker_exit).
+"""
+import os
+import sys
+
+from database import dispose_engines
+
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 1))
+preload_app = os.environ.get('PRELOAD_APP', '1').lower() not in ('0', 'false', 'no')
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('ACCESS_LOG') or None
+
+if workers > 1 and not os.environ.get('CACHE_BACKEND') and 'LOCAL_CACHES' not in os.environ:
+    os.environ['LOCAL_CACHES'] = '0'
+    print(f'gunicorn.conf.py: {workers} workers and no CACHE_BACKEND, per-process caches disabled',
+          file=sys.stderr)
+
+# Worker processes already spread the password hashing over the CPUs; a
+# single-threaded worker would only wait on its own hashing pool
+if threads == 1:
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+
+
+def post_fork(server, worker):
+    # The preloaded app (and any connection it opened) came from the
+    # master; the worker must open its own connections
+    if preload_app and 'wsgi' in sys.modules:
+        dispose_engines(sys.modules['wsgi'].app, close=False)
+
+
+def worker_exit(server, worker):
+    if 'wsgi' in sys.modules:
+        import passwords
+
+        passwords.shutdown_pool()
+        dispose_engines(sys.modules['wsgi'].app)
@@ -0,0 +1,41 @@
+"""Liveness and readiness probes for load balancers and process managers.
+
+    GET /healthz   the worker is up and answering (no database access)
+    GET /readyz    every engine (primary and replicas) answers SELECT 1;
+                   503 with the failing ones otherwise
+
+Neither needs a login, and the daily before_request jobs skip them, so a
+probe never waits on (or fails because of) the availability or sweep jobs.
+"""
+import os
+import time
+
+from flask import Blueprint, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+
+bp = Blueprint('health', __name__)
+
+
+@bp.route('/healthz')
+def healthz():
+    return jsonify(status='ok', pid=os.getpid())
+
+
+@bp.route('/readyz')
+def readyz():
+    databases = {}
+    for bind, engine in db.engines.items():
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except SQLAlchemyError as e:
+            databases[bind or 'primary'] = {'status': 'error', 'error': type(getattr(e, 'orig', None) or e).__name__}
+        else:
+            databases[bind or 'primary'] = {'status': 'ok', 'ms': round((time.perf_counter() - started) * 1000, 1)}
+    ready = all(check['status'] == 'ok' for check in databases.values())
+    return jsonify(status='ok' if ready else 'unavailable', databases=databases, pid=os.getpid()), \
+        200 if ready else 503
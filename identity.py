@@ -0,0 +1,154 @@
+"""The logged-in user for the current request.
+
+init_identity(app) loads a snapshot of the session's user into g.principal
+before each request. Snapshots are plain data kept in a small TTL + LRU
+(IDENTITY_CACHE_SIZE entries, IDENTITY_TTL seconds), so most requests need
+no query at all. A commit that changes an Admin, Doctor or Patient drops
+that user's snapshot, which is how toggling, removing or blacklisting an
+account takes effect on the user's very next request; the TTL bounds how
+long other worker processes can keep serving an old snapshot.
+
+With a shared CACHE_BACKEND the snapshots are kept there instead, so the
+drop is seen by every process at once. With LOCAL_CACHES=0 and no shared
+backend nothing is kept and every request loads its user.
+"""
+from dataclasses import asdict, dataclass
+
+from flask import g, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from cache import VERSION_PREFIX, NullBackend, TTLLRUBackend, cache
+from models import Admin, Doctor, Patient
+
+MODELS = {'admin': Admin, 'doctor': Doctor, 'patient': Patient}
+ROLES = {model: role for role, model in MODELS.items()}
+
+
+@dataclass(frozen=True)
+class Principal:
+    role: str
+    id: int
+    username: str
+    name: str
+    email: str
+    phone: str = None
+    is_active: bool = True
+    is_blacklisted: bool = False
+    specialization: str = None
+    department: dict = None
+
+
+class IdentityCache:
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.backend = TTLLRUBackend(maxsize)
+        self.ttl = ttl
+        self.shared = False
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('IDENTITY_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('IDENTITY_TTL', self.ttl)
+        self.shared = cache.shared
+        if self.shared:
+            self.backend = cache.backend
+        elif app.config.get('LOCAL_CACHES', True):
+            self.backend = TTLLRUBackend(self.maxsize)
+        else:
+            self.backend = NullBackend()
+
+    def _key(self, role, user_id):
+        if not self.shared:
+            return (role, user_id)
+        # clear() cannot empty a shared backend, so it starts a new generation
+        generation = cache.data_version('identity')
+        return f'identity:{generation[0]}:{generation[1]}:{role}:{user_id}'
+
+    def get(self, role, user_id):
+        key = self._key(role, user_id)
+        principal = self.backend.get(key)
+        if principal is None:
+            principal = load_principal(role, user_id)
+            if principal is not None:
+                self.backend.set(key, asdict(principal) if self.shared else principal, self.ttl)
+        elif self.shared:
+            principal = Principal(**principal)
+        return principal
+
+    def forget(self, keys):
+        for role, user_id in keys:
+            self.backend.delete(self._key(role, user_id))
+
+    def clear(self):
+        if self.shared:
+            cache.delete(VERSION_PREFIX + 'identity')
+        elif isinstance(self.backend, TTLLRUBackend):
+            self.backend = TTLLRUBackend(self.maxsize)
+
+
+identities = IdentityCache()
+
+
+def load_principal(role, user_id):
+    model = MODELS.get(role)
+    if model is None:
+        return None
+    query = model.query
+    if model is Doctor:
+        query = query.options(joinedload(Doctor.department))
+    user = query.get(user_id)
+    if user is None:
+        return None
+    if model is Admin:
+        return Principal(role, user.id, user.username, user.username, user.email)
+    if model is Doctor:
+        return Principal(role, user.id, user.username, user.name, user.email, user.phone,
+                         is_active=user.is_active is not False, specialization=user.specialization,
+                         department={'id': user.department_id, 'name': user.department.name})
+    return Principal(role, user.id, user.username, user.name, user.email, user.phone,
+                     is_active=user.is_active is not False, is_blacklisted=bool(user.is_blacklisted))
+
+
+def init_identity(app):
+    identities.init_app(app)
+
+    @app.before_request
+    def load_current_principal():
+        g.principal = None
+        if 'user_id' in session and 'role' in session:
+            g.principal = identities.get(session['role'], session['user_id'])
+
+
+def forget_after_commit(session, keys):
+    # (role, user_id) snapshots to drop once committed
+    session.info.setdefault('identity_keys', set()).update(keys)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_identity_keys(session, flush_context):
+    keys = {(ROLES[type(obj)], obj.id)
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+            if type(obj) in ROLES}
+    if keys:
+        forget_after_commit(session, keys)
+
+
+# Query.update()/delete() on a user table could touch anyone
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_identity_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if any(m.class_ in ROLES for m in orm_execute_state.all_mappers):
+            orm_execute_state.session.info['identity_clear'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_identities(session):
+    if session.info.pop('identity_clear', False):
+        identities.clear()
+    identities.forget(session.info.pop('identity_keys', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_keys(session):
+    session.info.pop('identity_keys', None)
+    session.info.pop('identity_clear', None)
@@ -0,0 +1,268 @@
+"""Run EXPLAIN QUERY PLAN over the statements the app actually issues and
+report every one that still scans a table.
+
+Usage: python index_advisor.py [--strict]
+
+Builds a scratch database with query_counter's seed data, then drives
+every route through the test client (reads first, then the writes) and
+runs the background jobs (sweep, availability materialization, rollup
+catch-up), capturing each statement with a before_cursor_execute hook.
+Every distinct SELECT, INSERT ... SELECT, UPDATE and DELETE is then
+explained with the parameters it was first run with, so SQLite can match
+partial indexes such as status = 'Booked' as it does at run time.
+
+Statements that read a whole table by design (listings with no WHERE
+clause or only an is_active filter, substring LIKE search when FTS5 is
+missing) are reported as
+expected scans and only fail the run with --strict. Declared indexes
+missing from the configured database (DATABASE_URL) are listed first.
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import event, inspect
+
+from app import create_app
+from models import db
+import availability
+import query_counter
+import rollups
+import search
+import sweeper
+
+SEED_ROWS = 20
+EXPLAINED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+FLAG_COLUMNS = {'is_active', 'is_blacklisted'}
+
+
+def routes():
+    # (role, method, url, form data); ids as query_counter.seed() creates
+    # them: appointment 3i-2 is patient 1 with doctor i tomorrow, 3i-1
+    # patient i with doctor 1 the day after, 3i a completed past visit
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    later = (date.today() + timedelta(days=7)).isoformat()
+    hours = {}
+    for offset in range(7):
+        day = (date.today() + timedelta(days=offset)).isoformat()
+        hours.update({f'available_{day}': 'yes', f'start_time_{day}': '09:00', f'end_time_{day}': '17:00'})
+    person = {'name': 'Index Advisor', 'phone': '5550100', 'age': '40', 'gender': 'Other', 'address': 'Street'}
+    doctor = {'name': 'Doc 2', 'email': 'doc2@example.com', 'phone': '5550100', 'specialization': 'General',
+              'department_id': '1', 'experience': '5'}
+    return [
+        (None, 'POST', '/login', {'username': 'nobody', 'password': 'x', 'role': 'patient'}),
+        (None, 'POST', '/login', {'username': 'nobody', 'password': 'x', 'role': 'doctor'}),
+        (None, 'POST', '/login', {'username': 'nobody', 'password': 'x', 'role': 'admin'}),
+        (None, 'POST', '/register', dict(person, username='advisor', password='x', email='advisor@example.com')),
+        *query_counter.LISTING_ROUTES,
+        ('admin', 'GET', '/admin/export?format=csv', None),
+        ('admin', 'GET', '/admin/add_doctor', None),
+        ('admin', 'GET', '/admin/update_doctor/2', None),
+        ('admin', 'GET', '/admin/doctor/2/edit', None),
+        ('admin', 'GET', '/admin/patient/2/edit', None),
+        ('doctor', 'GET', '/doctor/availability', None),
+        ('doctor', 'GET', '/doctor/update_treatment/3', None),
+        ('patient', 'GET', '/patient/earliest_slots', None),
+        ('patient', 'GET', '/patient/book_appointment/2', None),
+        ('patient', 'GET', '/patient/edit_profile', None),
+        ('patient', 'GET', '/patient/appointment/1/reschedule', None),
+
+        ('patient', 'POST', '/patient/book_appointment/2', {'date': tomorrow, 'time': '16:45', 'reason': 'Check'}),
+        ('patient', 'POST', '/patient/appointment/1/reschedule', {'date': tomorrow, 'time': '16:30'}),
+        ('patient', 'GET', '/patient/cancel_appointment/4', None),
+        ('patient', 'POST', '/patient/edit_profile', dict(person, email='pat1@example.com')),
+        ('doctor', 'POST', '/doctor/availability', hours),
+        ('doctor', 'POST', '/doctor/availability/template',
+         {'template_0': 'yes', 'template_start_0': '09:00', 'template_end_0': '17:00'}),
+        ('doctor', 'GET', '/doctor/mark_appointment/5/Completed', None),
+        ('doctor', 'POST', '/doctor/appointment/8/cancel', None),
+        ('doctor', 'POST', '/doctor/update_treatment/11', {'diagnosis': 'Flu', 'prescription': 'Rest', 'notes': ''}),
+        ('admin', 'POST', '/admin/add_doctor', dict(doctor, username='advisor', password='x',
+                                                    email='advisor@example.com')),
+        ('admin', 'POST', '/admin/update_doctor/2', doctor),
+        ('admin', 'POST', '/admin/doctor/2/edit', doctor),
+        ('admin', 'POST', '/admin/patient/2/edit', dict(person, email='pat2@example.com')),
+        ('admin', 'GET', '/admin/appointment/7/complete', None),
+        ('admin', 'GET', '/admin/appointment/10/cancel', None),
+        ('admin', 'POST', '/admin/appointments/bulk', {'action': 'cancel', 'ids': ['13', '16']}),
+        ('admin', 'POST', '/admin/doctor/3/cancel_appointments', {'start': tomorrow, 'end': later}),
+        ('admin', 'GET', '/admin/doctor/4/toggle', None),
+        ('admin', 'GET', '/admin/remove_doctor/5', None),
+        ('admin', 'POST', '/admin/doctors/bulk', {'action': 'deactivate', 'ids': ['6', '7']}),
+        ('admin', 'GET', '/admin/patient/4/toggle', None),
+        ('admin', 'GET', '/admin/patient/5/blacklist', None),
+        ('admin', 'GET', '/admin/remove_patient/6', None),
+        ('admin', 'POST', '/admin/patients/bulk', {'action': 'deactivate', 'ids': ['7', '8']}),
+    ]
+
+
+def jobs():
+    # (label, job) for the work that runs outside the request/response path
+    return [
+        ('materialize availability', availability.ensure_materialized),
+        ('sweep', lambda: sweeper.sweep(verbose=False)),
+        ('rollup catch-up', rollups.catch_up),
+    ]
+
+
+class StatementCapture:
+    """Distinct statements with the parameters and label of their first run."""
+
+    def __init__(self):
+        self.label = None
+        self.statements = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        head = statement.lstrip().upper()
+        if not head.startswith(EXPLAINED):
+            return
+        # INSERT ... VALUES has no plan to check; INSERT ... SELECT does
+        if head.startswith('INSERT') and not re.search(r'\bSELECT\b', head):
+            return
+        if executemany and parameters and isinstance(parameters[0], (list, tuple)):
+            parameters = parameters[0]
+        # The once-a-day sweep runs in its own thread, started by the first request
+        label = 'sweep' if threading.current_thread().name == 'appointment-sweeper' else self.label
+        self.statements.setdefault(statement, (label, parameters))
+
+
+def capture_statements(app, capture):
+    client = app.test_client()
+    # The jobs first, so their statements are not credited to the first route
+    job_list = jobs()
+    for label, job in job_list[:-1]:
+        capture.label = label
+        job()
+        db.session.commit()
+    for role, method, url, data in routes():
+        capture.label = f'{method} {url.split("?")[0]}'
+        if role:
+            with client.session_transaction() as sess:
+                sess.clear()
+                sess.update(user_id=1, role=role, username=role)
+        response = client.open(url, method=method, data=data, buffered=True)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}')
+        db.session.remove()
+    for thread in threading.enumerate():
+        if thread.name == 'appointment-sweeper':
+            thread.join()
+    # Catch up on the days the writes above marked
+    capture.label, job = job_list[-1]
+    job()
+    db.session.commit()
+
+
+def explain(statement, parameters):
+    plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, tuple(parameters)).all()
+    return [row[3] for row in plan]
+
+
+def is_table_scan(detail, subqueries=()):
+    # "SCAN appointment" is a full table scan; "SCAN appointment USING INDEX"
+    # still walks every row but in index order, which is what a full listing
+    # asks for. FTS5 lookups show up as "SCAN <name>_fts VIRTUAL TABLE INDEX".
+    # Scans of a subquery's result (a CO-ROUTINE or MATERIALIZE step of the
+    # same plan) and of sqlite_master (fts_enabled) read no table rows
+    if not detail.startswith('SCAN ') or 'USING' in detail or 'VIRTUAL TABLE' in detail:
+        return False
+    name = detail.split()[1]
+    return name != 'sqlite_master' and name not in subqueries
+
+
+def subqueries(plan):
+    return {d.split()[1] for d in plan if d.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+
+
+def is_expected_scan(statement):
+    # A statement without a WHERE clause reads the whole table by design, and
+    # so does one whose only conditions are on FLAG_COLUMNS, which nearly every
+    # row matches (active listings and the dashboard_stats counts): an index
+    # on them would not narrow the scan. Without FTS5 the search routes fall
+    # back to LIKE '%term%', which has to read every row
+    if not search.fts_enabled() and re.search(r'\bLIKE\b', statement, re.IGNORECASE):
+        return True
+    where = re.search(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\)|$)', statement,
+                      re.IGNORECASE | re.DOTALL)
+    if where is None:
+        return True
+    return set(re.findall(r'\b[a-z_]+\.([a-z_]+)\b', where.group(1))) <= FLAG_COLUMNS
+
+
+def missing_indexes():
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        missing.extend(ix.name for ix in table.indexes if ix.name not in existing)
+    return missing
+
+
+def summary(statement, width=150):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= width else statement[:width - 3] + '...'
+
+
+def run(strict=False):
+    with create_app({'BLUEPRINTS': []}).app_context():
+        missing = missing_indexes()
+        db.engine.dispose()
+    if missing:
+        print('Declared indexes missing from the database (run python init_db.py):')
+        for name in missing:
+            print('  ' + name)
+        print()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    failures = 0
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path})
+        with app.app_context():
+            db.create_all()
+            query_counter.seed(db, SEED_ROWS)
+            db.session.remove()
+
+            capture = StatementCapture()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                capture_statements(app, capture)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+
+            for statement, (label, parameters) in capture.statements.items():
+                plan = explain(statement, parameters)
+                scans = [d for d in plan if is_table_scan(d, subqueries(plan))]
+                if not scans:
+                    status = 'ok'
+                elif is_expected_scan(statement):
+                    status = 'scan (expected)'
+                    if strict:
+                        failures += 1
+                else:
+                    status = 'SCAN'
+                    failures += 1
+
+                print(f'[{status}] {label}: {summary(statement)}')
+                for detail in plan:
+                    print(f'    {detail}')
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print()
+    print(f'{len(capture.statements)} statements from {len(routes())} routes and {len(jobs())} jobs')
+    print(f'{failures} quer{"y" if failures == 1 else "ies"} scanning a table')
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if run(strict='--strict' in sys.argv[1:]) else 0)
@@ -1,11 +1,32 @@
-from app import app, db
-from models import Admin, Department
-from datetime import datetime
+from app import create_app
+from availability import remove_duplicate_days
+from models import db, Admin, Department, DoctorPatient, DoctorDayStats
+from dashboard_stats import reconcile
+import roster
+import rollups
+from sqlalchemy.exc import IntegrityError
+
+def create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except IntegrityError:
+                # e.g. existing double bookings block ux_appointment_booked_slot
+                print(f"Could not create unique index {index.name}: existing rows violate it")
 
 def init_database():
+    # Only the models and their bookkeeping are needed, not the views
+    app = create_app({'BLUEPRINTS': []})
     with app.app_context():
         # Create all tables
         db.create_all()
+
+        # create_all() skips indexes on tables that already exist, so add
+        # any declared index that an older database is missing
+        remove_duplicate_days()
+        db.session.commit()
+        create_missing_indexes()
         
         # Check if admin already exists
         admin = Admin.query.filter_by(username='admin').first()
@@ -34,6 +55,14 @@ def init_database():
                 db.session.add(dept)
         
         db.session.commit()
+
+        # Seed (or repair) the admin dashboard counters
+        reconcile(verbose=False)
+        # Older databases have appointments but no roster yet
+        if not DoctorPatient.query.first():
+            roster.rebuild(verbose=False)
+        if not DoctorDayStats.query.first():
+            rollups.rebuild(verbose=False)
         print("Database initialized successfully!")
         print("Default Admin - Username: admin, Password: admin123")
 
@@ -0,0 +1,50 @@
+"""Cached, user-independent listings for the patient dashboard.
+
+Stored as plain dicts so any cache backend can hold them. create_app()
+imports this module even when the patient views are not registered, so
+that doctor and admin writes still drop the cached copies.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy.orm import contains_eager
+
+from models import Doctor, Department, DoctorAvailability
+from cache import cache
+
+
+def availability_cache_key(day):
+    return f'availability:{day.isoformat()}'
+
+
+def load_availability(today):
+    next_week = today + timedelta(days=7)
+    availabilities = DoctorAvailability.query.filter(
+        DoctorAvailability.date >= today,
+        DoctorAvailability.date <= next_week,
+        DoctorAvailability.is_available == True
+    ).join(Doctor).filter(Doctor.is_active == True).options(
+        contains_eager(DoctorAvailability.doctor)
+    ).all()
+    return [
+        {
+            'date': av.date,
+            'start_time': av.start_time,
+            'end_time': av.end_time,
+            'doctor_id': av.doctor.id,
+            'doctor_name': av.doctor.name,
+            'specialization': av.doctor.specialization,
+        }
+        for av in availabilities
+    ]
+
+
+def load_departments():
+    return [
+        {'id': d.id, 'name': d.name, 'description': d.description}
+        for d in Department.query.all()
+    ]
+
+
+# The key carries the date, so the listing also turns over at midnight
+cache.invalidate_on_commit([Doctor, DoctorAvailability], lambda: [availability_cache_key(date.today())])
+cache.invalidate_on_commit([Department], lambda: ['departments'])
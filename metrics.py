@@ -0,0 +1,185 @@
+"""Per-endpoint request metrics in Prometheus text format.
+
+init_metrics(app) records, for every request, the latency, the number of SQL
+statements (from query_counter's g.sql_queries), the time spent executing
+them and the time spent rendering templates, aggregated per Flask endpoint.
+render_metrics() formats the totals for a Prometheus scrape. The numbers are
+per process, so with several workers each one reports its own share.
+
+Any statement slower than SLOW_QUERY_THRESHOLD_MS (default 200) is logged
+to the "slow_query" logger with its parameters and the route it came from.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_app_context, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds, as in the Prometheus client's default buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_log = logging.getLogger('slow_query')
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.total}'
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.render = defaultdict(Histogram)
+        self.requests = defaultdict(int)
+        self.sql_statements = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.slow_queries = defaultdict(int)
+
+    def record_request(self, endpoint, method, status, elapsed, statements, sql_seconds, render_seconds):
+        with self.lock:
+            self.latency[endpoint].observe(elapsed)
+            self.requests[(endpoint, method, status)] += 1
+            self.sql_statements[endpoint] += statements
+            self.sql_seconds[endpoint] += sql_seconds
+            if render_seconds:
+                self.render[endpoint].observe(render_seconds)
+
+    def record_slow_query(self, endpoint):
+        with self.lock:
+            self.slow_queries[endpoint] += 1
+
+
+metrics = Metrics()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    lines = []
+    with metrics.lock:
+        lines += ['# HELP http_request_duration_seconds Request latency by endpoint.',
+                  '# TYPE http_request_duration_seconds histogram']
+        for endpoint, histogram in sorted(metrics.latency.items()):
+            lines += histogram.lines('http_request_duration_seconds', f'endpoint="{_label(endpoint)}"')
+
+        lines += ['# HELP http_requests_total Requests by endpoint, method and status.',
+                  '# TYPE http_requests_total counter']
+        for (endpoint, method, status), count in sorted(metrics.requests.items()):
+            lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                         f'status="{status}"}} {count}')
+
+        lines += ['# HELP sql_statements_total SQL statements executed by endpoint.',
+                  '# TYPE sql_statements_total counter']
+        for endpoint, count in sorted(metrics.sql_statements.items()):
+            lines.append(f'sql_statements_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+        lines += ['# HELP sql_duration_seconds_total Time spent executing SQL by endpoint.',
+                  '# TYPE sql_duration_seconds_total counter']
+        for endpoint, seconds in sorted(metrics.sql_seconds.items()):
+            lines.append(f'sql_duration_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+
+        lines += ['# HELP sql_slow_queries_total Statements over SLOW_QUERY_THRESHOLD_MS by endpoint.',
+                  '# TYPE sql_slow_queries_total counter']
+        for endpoint, count in sorted(metrics.slow_queries.items()):
+            lines.append(f'sql_slow_queries_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+        lines += ['# HELP template_render_seconds Template rendering time per request by endpoint.',
+                  '# TYPE template_render_seconds histogram']
+        for endpoint, histogram in sorted(metrics.render.items()):
+            lines += histogram.lines('template_render_seconds', f'endpoint="{_label(endpoint)}"')
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return None
+
+
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('statement_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_app_context() and 'sql_seconds' in g:
+        g.sql_seconds += elapsed
+        threshold = g.slow_query_threshold
+    else:
+        threshold = None
+    if threshold is not None and elapsed * 1000 >= threshold:
+        endpoint = _endpoint()
+        metrics.record_slow_query(endpoint)
+        slow_query_log.warning('%.1f ms on %s: %s; parameters: %r',
+                               elapsed * 1000, endpoint, statement, parameters)
+
+
+def _discard_statement(exception_context):
+    # after_cursor_execute never fires for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('statement_start'):
+        connection.info['statement_start'].pop()
+
+
+def _start_render(sender, template, context, **extra):
+    if has_app_context() and 'render_seconds' in g:
+        g.render_start = time.perf_counter()
+
+
+def _finish_render(sender, template, context, **extra):
+    if has_app_context() and 'render_start' in g:
+        g.render_seconds += time.perf_counter() - g.pop('render_start')
+
+
+def init_metrics(app):
+    if not event.contains(Engine, 'before_cursor_execute', _start_statement):
+        event.listen(Engine, 'before_cursor_execute', _start_statement)
+        event.listen(Engine, 'after_cursor_execute', _finish_statement)
+        event.listen(Engine, 'handle_error', _discard_statement)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.sql_seconds = 0.0
+        g.render_seconds = 0.0
+        g.slow_query_threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200)
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_start' in g:
+            metrics.record_request(
+                request.endpoint or 'unknown', request.method, response.status_code,
+                time.perf_counter() - g.request_start, g.get('sql_queries', 0),
+                g.sql_seconds, g.render_seconds,
+            )
+        return response
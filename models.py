@@ -1,8 +1,25 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from passwords import hash_password, verify_password
+from database import RoutingSession
 from datetime import datetime
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# WAL lets readers keep going while a booking commits, and busy_timeout makes
+# concurrent writers wait for the lock instead of failing straight away
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
 
 class Admin(db.Model):
     __tablename__ = 'admin'
@@ -12,10 +29,10 @@ class Admin(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Department(db.Model):
     __tablename__ = 'department'
@@ -41,10 +58,10 @@ class Doctor(db.Model):
     availability = db.relationship('DoctorAvailability', backref='doctor', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Patient(db.Model):
     __tablename__ = 'patient'
@@ -64,10 +81,10 @@ class Patient(db.Model):
     appointments = db.relationship('Appointment', backref='patient', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class DoctorAvailability(db.Model):
     __tablename__ = 'doctor_availability'
@@ -78,6 +95,31 @@ class DoctorAvailability(db.Model):
     end_time = db.Column(db.Time, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        # One row per doctor and day (availability.materialize relies on it);
+        # also serves the per-doctor lookups (book_appointment, doctor_availability)
+        db.Index('ux_doctor_availability_doctor_date', 'doctor_id', 'date', unique=True),
+        # Cross-doctor 7 day window (patient_dashboard)
+        db.Index('ix_doctor_availability_open_date', 'date', 'doctor_id',
+                 sqlite_where=db.text('is_available = 1')),
+    )
+
+class AvailabilityTemplate(db.Model):
+    # Recurring weekly hours; availability.py copies them into
+    # DoctorAvailability for dates the doctor has not set explicitly
+    __tablename__ = 'availability_template'
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday, as date.weekday()
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+
+    __table_args__ = (
+        db.Index('ux_availability_template_doctor_weekday', 'doctor_id', 'weekday', unique=True),
+        # Materializing one date at a time
+        db.Index('ix_availability_template_weekday', 'weekday'),
+    )
+
 class Appointment(db.Model):
     __tablename__ = 'appointment'
     id = db.Column(db.Integer, primary_key=True)
@@ -85,12 +127,40 @@ class Appointment(db.Model):
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
-    status = db.Column(db.String(20), default='Booked')  # Booked, Completed, Cancelled
+    status = db.Column(db.String(20), default='Booked')  # Booked, Completed, Cancelled, Expired (sweeper.py)
     reason = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     treatment = db.relationship('Treatment', backref='appointment', uselist=False, cascade='all, delete-orphan')
 
+    # Statuses a doctor may set from the dashboard (mark_appointment)
+    MARKABLE_STATUSES = ('Completed', 'Cancelled')
+
+    def is_owned_by(self, role, user_id):
+        # Doctors manage their own schedule and patients their own bookings;
+        # shared by the HTML views and the JSON API
+        if role == 'doctor':
+            return self.doctor_id == user_id
+        if role == 'patient':
+            return self.patient_id == user_id
+        return role == 'admin'
+
+    __table_args__ = (
+        # Slot collision checks and the doctor's own schedule
+        db.Index('ix_appointment_doctor_date_time', 'doctor_id', 'date', 'time', 'status'),
+        # Patient dashboard / history
+        db.Index('ix_appointment_patient_date_status', 'patient_id', 'date', 'status'),
+        # A doctor can hold only one booked appointment per slot; this is what
+        # makes booking race-free across workers
+        db.Index('ux_appointment_booked_slot', 'doctor_id', 'date', 'time', unique=True,
+                 sqlite_where=db.text("status = 'Booked'")),
+        # Admin "upcoming" list only ever looks at booked rows
+        db.Index('ix_appointment_booked_date_time', 'date', 'time',
+                 sqlite_where=db.text("status = 'Booked'")),
+        # Full listing ordered by date/time (view_appointments)
+        db.Index('ix_appointment_date_time', 'date', 'time'),
+    )
+
 class Treatment(db.Model):
     __tablename__ = 'treatment'
     id = db.Column(db.Integer, primary_key=True)
@@ -99,3 +169,93 @@ class Treatment(db.Model):
     prescription = db.Column(db.Text)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DoctorPatient(db.Model):
+    # Roster of each doctor's patients, kept up to date by roster.py.
+    # first_seen/last_seen span every appointment between the two;
+    # visit_count leaves out cancelled ones.
+    __tablename__ = 'doctor_patient'
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), primary_key=True)
+    first_seen = db.Column(db.Date, nullable=False)
+    last_seen = db.Column(db.Date, nullable=False)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+
+    patient = db.relationship('Patient', viewonly=True)
+
+    __table_args__ = (
+        # doctor_dashboard roster, most recent first
+        db.Index('ix_doctor_patient_doctor_last_seen', 'doctor_id', 'last_seen', 'patient_id'),
+    )
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counter'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    # Write counter per table, bumped inside the writing transaction (see data_versions.py)
+    __tablename__ = 'data_version'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class DoctorDayStats(db.Model):
+    # Daily utilization rollup (see rollups.py), one row per doctor and day
+    # with any appointment or availability in either tier
+    __tablename__ = 'doctor_day_stats'
+    date = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+    available_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+class RollupPendingDay(db.Model):
+    # Days whose DoctorDayStats rows are out of date
+    __tablename__ = 'rollup_pending_day'
+    date = db.Column(db.Date, primary_key=True)
+
+class ImportCheckpoint(db.Model):
+    __tablename__ = 'import_checkpoint'
+    source = db.Column(db.String(500), primary_key=True)
+    line = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Archive tier (see archive.py): Completed/Cancelled appointments older than
+# the retention window, with their treatments. Rows keep their original ids
+# and columns, so templates can render either model.
+class ArchivedAppointment(db.Model):
+    __tablename__ = 'appointment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    doctor = db.relationship('Doctor', viewonly=True)
+    patient = db.relationship('Patient', viewonly=True)
+    treatment = db.relationship('ArchivedTreatment', uselist=False, viewonly=True)
+
+    __table_args__ = (
+        # patient_history / past appointments
+        db.Index('ix_appointment_archive_patient_date', 'patient_id', 'date'),
+        # doctor_patient_history and the doctor's patient list
+        db.Index('ix_appointment_archive_doctor_patient', 'doctor_id', 'patient_id'),
+        # Date-range exports (export.py)
+        db.Index('ix_appointment_archive_date_time', 'date', 'time'),
+    )
+
+class ArchivedTreatment(db.Model):
+    __tablename__ = 'treatment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment_archive.id'), nullable=False, unique=True)
+    diagnosis = db.Column(db.Text, nullable=False)
+    prescription = db.Column(db.Text)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
@@ -0,0 +1,89 @@
+"""Keyset (cursor) pagination for the admin listings.
+
+Pages are selected with a WHERE on the sort key instead of OFFSET, so every
+page costs one index range scan however deep into the table it is. Cursors
+are the sort key of the first/last row of a page, e.g. "2024-05-01_10:30:00_42".
+"""
+from datetime import date, time
+
+from flask import abort, request
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+_parsers = {
+    date: date.fromisoformat,
+    time: time.fromisoformat,
+    int: int,
+}
+
+
+class KeysetPage:
+    def __init__(self, items, next_args=None, prev_args=None):
+        self.items = items
+        self.next_args = next_args
+        self.prev_args = prev_args
+
+    @property
+    def has_next(self):
+        return self.next_args is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_args is not None
+
+
+def page_size(param='per_page', default=DEFAULT_PAGE_SIZE):
+    per_page = request.args.get(param, default, type=int)
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def encode_cursor(row, keys):
+    return '_'.join(str(getattr(row, key.key)) for key in keys)
+
+
+def decode_cursor(cursor, keys):
+    parts = cursor.split('_')
+    if len(parts) != len(keys):
+        abort(400)
+    try:
+        return [_parsers[key.type.python_type](part) for key, part in zip(keys, parts)]
+    except (KeyError, ValueError):
+        abort(400)
+
+
+def keyset_page(query, keys, descending=False, prefix='', per_page=None):
+    """Return one page of query ordered by keys (ending in a unique column).
+
+    Reads <prefix>after / <prefix>before from the request args; the page's
+    next_args/prev_args are the request args to pass to url_for for the
+    neighbouring pages.
+    """
+    per_page = per_page or page_size(prefix + 'per_page')
+    after = request.args.get(prefix + 'after')
+    before = request.args.get(prefix + 'before')
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+
+    # Walking backwards means scanning the index in the opposite direction
+    scan_desc = descending != backwards
+    if cursor:
+        values = tuple_(*[literal(value, key.type) for key, value in zip(keys, decode_cursor(cursor, keys))])
+        query = query.filter(tuple_(*keys) < values if scan_desc else tuple_(*keys) > values)
+    query = query.order_by(*[key.desc() if scan_desc else key.asc() for key in keys])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    base_args = {k: v for k, v in request.args.items() if k not in (prefix + 'after', prefix + 'before')}
+    next_args = prev_args = None
+    if rows and (has_more if not backwards else cursor):
+        next_args = dict(base_args, **{prefix + 'after': encode_cursor(rows[-1], keys)})
+    if rows and (has_more if backwards else cursor):
+        prev_args = dict(base_args, **{prefix + 'before': encode_cursor(rows[0], keys)})
+
+    return KeysetPage(rows, next_args, prev_args)
@@ -0,0 +1,108 @@
+"""Password hashing backend.
+
+Hashes use werkzeug's generate_password_hash/check_password_hash with the
+method string from PASSWORD_HASH_METHOD (e.g. "scrypt:32768:8:1" or
+"pbkdf2:sha256:600000"). The key derivation runs in a process pool of
+PASSWORD_HASH_WORKERS processes so request threads are not tied up doing
+CPU-bound work; at most PASSWORD_HASH_QUEUE jobs may be waiting at once and
+further callers block until a slot frees up. Set PASSWORD_HASH_WORKERS to 0
+to hash inline.
+
+needs_rehash() tells login when a stored hash was made with different
+parameters, so it can be upgraded while the plaintext is at hand.
+"""
+import os
+import threading
+from functools import lru_cache
+from itertools import repeat
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_HASH_WORKERS': min(4, os.cpu_count() or 1),
+    'PASSWORD_HASH_QUEUE': 64,
+}
+
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _config(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def _get_pool():
+    global _pool, _pool_pid, _slots
+    workers = _config('PASSWORD_HASH_WORKERS')
+    if not workers:
+        return None
+    with _pool_lock:
+        # A pool inherited across fork() is unusable; start a fresh one
+        if _pool is None or _pool_pid != os.getpid():
+            # multiprocessing is only loaded by processes that hash passwords
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Not fork: the web process has other threads (server threads,
+            # the sweeper), and a forked child can inherit one of their
+            # locks held and deadlock on it
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(_config('PASSWORD_HASH_QUEUE'))
+    return _pool
+
+
+def _run(fn, *args):
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    with _slots:
+        return pool.submit(fn, *args).result()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+
+
+def hash_method():
+    return _config('PASSWORD_HASH_METHOD')
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def hash_passwords(passwords):
+    # Bulk variant for imports: spread the batch over the whole pool
+    pool = _get_pool()
+    method = hash_method()
+    if pool is None:
+        return [generate_password_hash(p, method) for p in passwords]
+    chunksize = max(1, len(passwords) // (_config('PASSWORD_HASH_WORKERS') * 4))
+    return list(pool.map(generate_password_hash, passwords, repeat(method), chunksize=chunksize))
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def _method_prefix(method):
+    # "scrypt" is stored as "scrypt:32768:8:1" etc., so compare against what
+    # werkzeug actually writes for the configured method
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _method_prefix(hash_method())
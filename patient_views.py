@@ -0,0 +1,261 @@
+"""Patient views: dashboard, doctor search, booking, rescheduling and history."""
+import time
+from datetime import datetime, timedelta, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, g
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import joinedload
+
+from models import db, Doctor, Patient, Appointment, DoctorAvailability
+from archive import read_both
+from auth_views import login_required
+from cache import cache
+from database import replica_reads
+from fragments import caches_fragments
+from listings import availability_cache_key, load_availability, load_departments
+from slots import slot_engine
+import search
+
+bp = Blueprint('patient', __name__, url_prefix='/patient')
+
+BOOKING_RETRIES = 5
+
+# Apply a booking/reschedule and commit it. The unique index on booked
+# (doctor_id, date, time) decides who gets a contested slot, so there is no
+# check-then-insert window. Returns False if the slot is already taken.
+def commit_booking(apply_change):
+    for attempt in range(BOOKING_RETRIES):
+        apply_change()
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        except OperationalError as e:
+            # SQLite lock contention outlasting busy_timeout: back off and retry
+            db.session.rollback()
+            if 'locked' not in str(e.orig) or attempt == BOOKING_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+@bp.route('/dashboard')
+@login_required(role='patient')
+@replica_reads
+@caches_fragments
+def patient_dashboard():
+    patient_id = session.get('user_id')
+    patient = g.principal
+    
+    # Get doctors availability for next 7 days (shared by every patient)
+    today = date.today()
+    availabilities = cache.get_or_set(availability_cache_key(today), lambda: load_availability(today))
+    
+    # Upcoming appointments
+    upcoming_appointments = Appointment.query.options(
+        joinedload(Appointment.doctor)
+    ).filter(
+        Appointment.patient_id == patient_id,
+        Appointment.date >= today,
+        Appointment.status == 'Booked'
+    ).order_by(Appointment.date, Appointment.time).all()
+    
+    # Past appointments (the older ones may already be archived); the daily
+    # sweep expires bookings left over from earlier days, so anything not
+    # Booked any more is history
+    past_appointments = read_both(lambda model: model.query.options(
+        joinedload(model.doctor)
+    ).filter(
+        model.patient_id == patient_id,
+        model.status != 'Booked'
+    ), limit=10)
+
+    departments = cache.get_or_set('departments', load_departments)
+
+    # Earliest free slots, optionally narrowed to a department
+    slot_department_id = request.args.get('department_id', type=int)
+    earliest_slots = slot_engine.earliest(k=5, department_id=slot_department_id)
+    
+    return render_template('patient_dashboard.html',
+                         patient=patient,
+                         availabilities=availabilities,
+                         upcoming_appointments=upcoming_appointments,
+                         past_appointments=past_appointments,
+                         departments=departments,
+                         earliest_slots=earliest_slots,
+                         slot_department_id=slot_department_id)
+
+@bp.route('/earliest_slots')
+@login_required(role='patient')
+def earliest_slots():
+    k = max(1, min(request.args.get('k', 5, type=int), 50))
+    slots = slot_engine.earliest(
+        k=k,
+        department_id=request.args.get('department_id', type=int),
+        specialization=request.args.get('specialization'),
+        days=request.args.get('days', 7, type=int)
+    )
+    for slot in slots:
+        slot['date'] = slot['date'].isoformat()
+        slot['time'] = slot['time'].strftime('%H:%M')
+    return jsonify(slots=slots)
+
+@bp.route('/edit_profile', methods=['GET', 'POST'])
+@login_required(role='patient')
+def edit_profile():
+    patient_id = session.get('user_id')
+    patient = Patient.query.get(patient_id)
+    
+    if request.method == 'POST':
+        patient.name = request.form.get('name')
+        patient.email = request.form.get('email')
+        patient.phone = request.form.get('phone')
+        patient.age = int(request.form.get('age')) if request.form.get('age') else None
+        patient.gender = request.form.get('gender')
+        patient.address = request.form.get('address')
+        
+        db.session.commit()
+        flash('Profile updated successfully', 'success')
+        return redirect(url_for('patient.patient_dashboard'))
+    
+    return render_template('edit_profile.html', patient=patient)
+
+@bp.route('/search_doctors', methods=['GET', 'POST'])
+@login_required(role='patient')
+@replica_reads
+def search_doctors():
+    if request.method == 'POST':
+        search_query = request.form.get('search_query')
+        
+        doctors = search.search_doctors(search_query).options(
+            joinedload(Doctor.department)
+        ).filter(
+            Doctor.is_active == True
+        ).all()
+        
+        return render_template('search_doctors.html', doctors=doctors, search_query=search_query)
+    
+    return render_template('search_doctors.html')
+
+@bp.route('/book_appointment/<int:doctor_id>', methods=['GET', 'POST'])
+@login_required(role='patient')
+def book_appointment(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+    patient_id = session.get('user_id')
+    
+    if request.method == 'POST':
+        appointment_date = request.form.get('date')
+        appointment_time = request.form.get('time')
+        reason = request.form.get('reason')
+        
+        appointment_date = datetime.strptime(appointment_date, '%Y-%m-%d').date()
+        appointment_time = datetime.strptime(appointment_time, '%H:%M').time()
+        
+        # If user picks a past date/time, move it to now (today, current time)
+        today = date.today()
+        now_dt = datetime.now()
+        now_time = now_dt.time()
+        
+        if appointment_date < today:
+            appointment_date = today
+            appointment_time = now_time
+        elif appointment_date == today and appointment_time <= now_time:
+            appointment_time = now_time
+
+        
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            date=appointment_date,
+            time=appointment_time,
+            reason=reason,
+            status='Booked'
+        )
+        
+        if not commit_booking(lambda: db.session.add(appointment)):
+            flash('This time slot is already booked. Please choose another time.', 'danger')
+            return redirect(url_for('patient.book_appointment', doctor_id=doctor_id))
+        
+        flash('Appointment booked successfully', 'success')
+        return redirect(url_for('patient.patient_dashboard'))
+    
+    # Get doctor's availability for next 7 days
+    today = date.today()
+    next_week = today + timedelta(days=7)
+    availabilities = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date >= today,
+        DoctorAvailability.date <= next_week,
+        DoctorAvailability.is_available == True
+    ).all()
+    
+    return render_template('book_appointment.html',
+                       doctor=doctor,
+                       availabilities=availabilities,
+                       datetime=datetime)
+
+@bp.route('/cancel_appointment/<int:appointment_id>')
+@login_required(role='patient')
+def cancel_appointment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    
+    if not appointment.is_owned_by(session.get('role'), session.get('user_id')):
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('patient.patient_dashboard'))
+    
+    appointment.status = 'Cancelled'
+    db.session.commit()
+    
+    flash('Appointment cancelled successfully', 'success')
+    return redirect(url_for('patient.patient_dashboard'))
+
+@bp.route('/appointment/<int:appointment_id>/reschedule', methods=['GET', 'POST'])
+@login_required(role='patient')
+def reschedule_appointment(appointment_id):
+    appt = Appointment.query.get_or_404(appointment_id)
+
+    if not appt.is_owned_by(session.get('role'), session.get('user_id')):
+        flash('You cannot modify this appointment.', 'danger')
+        return redirect(url_for('patient.patient_dashboard'))
+
+    if appt.status != 'Booked':
+        flash('Only booked appointments can be rescheduled.', 'danger')
+        return redirect(url_for('patient.patient_dashboard'))
+
+    if request.method == 'POST':
+        new_date_str = request.form.get('date')
+        new_time_str = request.form.get('time')
+
+        new_date = datetime.strptime(new_date_str, '%Y-%m-%d').date()
+        new_time = datetime.strptime(new_time_str, '%H:%M').time()
+
+        def move():
+            appt.date = new_date
+            appt.time = new_time
+
+        if not commit_booking(move):
+            flash('Doctor already has an appointment at that time.', 'danger')
+            return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment_id))
+        flash('Appointment rescheduled.', 'success')
+        return redirect(url_for('patient.patient_dashboard'))
+
+    return render_template('reschedule_appointment.html', appointment=appt)
+
+
+@bp.route('/history')
+@login_required(role='patient')
+@replica_reads
+def patient_history():
+    patient_id = session.get('user_id')
+    patient = g.principal
+    
+    # Get all completed appointments with treatments, from both tiers
+    appointments = read_both(lambda model: model.query.options(
+        joinedload(model.doctor),
+        joinedload(model.treatment)
+    ).filter(
+        model.patient_id == patient_id,
+        model.status == 'Completed'
+    ))
+    
+    return render_template('patient_history.html', patient=patient, appointments=appointments, user_role='patient')
@@ -0,0 +1,148 @@
+"""Per-request SQL statement counting.
+
+init_query_counter(app) keeps a running count in g.sql_queries for every
+request (and adds an X-SQL-Queries response header when the
+SQL_QUERY_COUNT_HEADER config flag is set).
+
+Running this module checks the listing routes for N+1 queries: it renders
+each route against a scratch database at two data sizes and fails if the
+statement count grows with the number of rows shown.
+
+Usage: python query_counter.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, time, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+
+
+def init_query_counter(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.before_request
+    def start_query_count():
+        g.sql_queries = 0
+
+    @app.after_request
+    def add_query_count_header(response):
+        if app.config.get('SQL_QUERY_COUNT_HEADER') and 'sql_queries' in g:
+            response.headers['X-SQL-Queries'] = str(g.sql_queries)
+        return response
+
+
+# (role, method, url, form data) for every route that renders a list
+LISTING_ROUTES = [
+    ('admin', 'GET', '/admin/dashboard', None),
+    ('admin', 'GET', '/admin/view_appointments', None),
+    ('admin', 'GET', '/admin/analytics', None),
+    ('admin', 'POST', '/admin/search', {'search_query': 'Doc', 'search_type': 'doctor'}),
+    ('admin', 'POST', '/admin/search', {'search_query': 'Pat', 'search_type': 'patient'}),
+    ('doctor', 'GET', '/doctor/dashboard', None),
+    ('doctor', 'GET', '/doctor/patient_history/1', None),
+    ('patient', 'GET', '/patient/dashboard', None),
+    ('patient', 'GET', '/patient/history', None),
+    ('patient', 'POST', '/patient/search_doctors', {'search_query': 'Doc'}),
+]
+
+
+def seed(db, n):
+    from models import Admin, Doctor, Patient, Appointment, Treatment, Department, DoctorAvailability
+
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+
+    db.session.add(Admin(username='admin', email='admin@example.com', password_hash='x'))
+    dept = Department(name='General Medicine')
+    db.session.add(dept)
+    db.session.flush()
+
+    for i in range(1, n + 1):
+        db.session.add(Doctor(id=i, username=f'doc{i}', password_hash='x', name=f'Doc {i}',
+                              email=f'doc{i}@example.com', specialization='General',
+                              department_id=dept.id))
+        db.session.add(Patient(id=i, username=f'pat{i}', password_hash='x', name=f'Pat {i}',
+                               email=f'pat{i}@example.com'))
+        db.session.add(DoctorAvailability(doctor_id=i, date=tomorrow,
+                                          start_time=time(9, 0), end_time=time(17, 0)))
+    db.session.flush()
+
+    for i in range(1, n + 1):
+        slot = time(9 + i // 60 % 8, i % 60)
+        # Upcoming for patient 1 with every doctor, and for doctor 1 with every patient
+        db.session.add(Appointment(patient_id=1, doctor_id=i, date=tomorrow, time=slot, status='Booked'))
+        db.session.add(Appointment(patient_id=i, doctor_id=1, date=tomorrow + timedelta(days=1),
+                                   time=slot, status='Booked'))
+        # Treatment history between patient 1 and doctor 1
+        past = Appointment(patient_id=1, doctor_id=1, date=today - timedelta(days=i),
+                           time=slot, status='Completed')
+        past.treatment = Treatment(diagnosis=f'Diagnosis {i}', prescription='Rest', notes='')
+        db.session.add(past)
+    db.session.commit()
+
+    # As the scheduled catch-up job would; the analytics page then only reads
+    import rollups
+    rollups.catch_up()
+
+
+def count_route_queries(app, db, n):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    seed(db, n)
+    db.session.remove()
+
+    counts = []
+    client = app.test_client()
+    for role, method, url, data in LISTING_ROUTES:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role'] = role
+            sess['username'] = role
+        response = client.open(url, method=method, data=data)
+        if response.status_code != 200:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}')
+        counts.append(int(response.headers['X-SQL-Queries']))
+        db.session.remove()
+    return counts
+
+
+def check_routes(small=5, large=50):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+
+    app.config['SQL_QUERY_COUNT_HEADER'] = True
+    try:
+        with app.app_context():
+            small_counts = count_route_queries(app, db, small)
+            large_counts = count_route_queries(app, db, large)
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+    failures = 0
+    for (role, method, url, data), few, many in zip(LISTING_ROUTES, small_counts, large_counts):
+        grows = many > few
+        failures += grows
+        label = f'{method} {url}' + (f' {data}' if data else '')
+        print(f'[{"N+1" if grows else "ok"}] {label}: {few} queries at {small} rows, {many} at {large} rows')
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if check_routes() else 0)
@@ -0,0 +1,81 @@
+"""Keep a SQLite copy of the database up to date, as a local read replica.
+
+Each refresh copies the primary into the replica file with SQLite's online
+backup API: the copy is a consistent snapshot, writers on the primary are
+not blocked, and connections the app already holds to the replica see the
+new contents on their next read. Run it next to the app and point
+DATABASE_REPLICA_URLS at the copy (see database.py):
+
+    DATABASE_REPLICA_URLS=sqlite:///hospital_replica.db python replica.py [--interval 2] [--once]
+
+The primary is DATABASE_URL (default hospital.db); every DATABASE_REPLICA_URLS
+entry is refreshed from it. Relative paths are resolved in the instance
+folder, as Flask-SQLAlchemy does. Replica lag is at most
+--interval plus the time one copy takes, so keep READ_YOUR_WRITES_SECONDS
+above that. A refresh that fails (e.g. the replica is locked by a reader)
+is reported and retried on the next interval; with --once the exit status
+is 1.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from sqlalchemy.engine import make_url
+
+from database import replica_binds
+
+
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def sqlite_path(url):
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise ValueError(f'{url} is not a SQLite file database')
+    return os.path.join(INSTANCE_PATH, url.database)
+
+
+def refresh(primary_path, replica_path):
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        # pages=-1 copies everything in one step, from a single snapshot
+        source.backup(target, pages=-1)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh a SQLite read replica with the backup API.')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between refreshes')
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+
+    replicas = [sqlite_path(url) for url in replica_binds().values()]
+    if not replicas:
+        parser.error('set DATABASE_REPLICA_URLS to the replicas to refresh')
+    primary = sqlite_path(os.environ.get('DATABASE_URL', 'sqlite:///hospital.db'))
+
+    while True:
+        started = time.perf_counter()
+        failed = 0
+        for replica in replicas:
+            try:
+                refresh(primary, replica)
+            except sqlite3.OperationalError as e:
+                failed += 1
+                print(f'{time.strftime("%H:%M:%S")} {replica}: refresh failed ({e}), retrying',
+                      file=sys.stderr, flush=True)
+        elapsed = time.perf_counter() - started
+        print(f'{time.strftime("%H:%M:%S")} {len(replicas) - failed} of {len(replicas)} replica(s) '
+              f'refreshed in {elapsed * 1000:.0f} ms', flush=True)
+        if args.once:
+            return 1 if failed else 0
+        time.sleep(max(args.interval - elapsed, 0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Daily utilization rollups for the admin analytics page.
+
+doctor_day_stats holds, per doctor and day, the Booked / Completed /
+Cancelled / Expired appointment counts (both tiers), the minutes those
+appointments occupy and the minutes the doctor published as available.
+Everything but Cancelled counts as occupied: an Expired booking held its
+slot until the day was over. Flushes that
+touch an appointment or an availability row only record the day in
+rollup_pending_day; catch_up() recomputes just those days, one
+transaction per chunk of days, and is safe to run any number of times
+(the analytics page runs it first, so pending days are never shown stale).
+
+Writes that bypass the ORM mark their days with mark_days(), or, for bulk
+loads, call rebuild(), which marks every day that has data. rebuild() also
+recreates the table, so run it after upgrading to a version that changes
+its columns.
+
+The analytics page reads them through analytics.report().
+
+Usage: python rollups.py [--rebuild]
+"""
+import argparse
+import time
+
+from sqlalchemy import case, delete, event, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from database import use_primary
+from models import db, Appointment, ArchivedAppointment, DoctorAvailability, DoctorDayStats, RollupPendingDay
+from slots import SLOT_MINUTES
+
+CHUNK_DAYS = 31
+
+stats = DoctorDayStats.__table__
+pending = RollupPendingDay.__table__
+
+
+def mark_days(connection, days):
+    days = sorted(set(days))
+    if days:
+        connection.execute(insert(pending).prefix_with('OR IGNORE'), [{'date': d} for d in days])
+
+
+def _touched_days(session):
+    days = set()
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(obj, (Appointment, DoctorAvailability)):
+            days.add(obj.date)
+            if obj in session.dirty:
+                # A rescheduled appointment also changes its old day
+                days.update(db.inspect(obj).attrs.date.history.deleted)
+    days.discard(None)
+    return days
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_touched_days(session, flush_context):
+    mark_days(session.connection(), _touched_days(session))
+
+
+def _minutes(start, end):
+    return (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+
+
+def refresh_days(connection, days):
+    rows = {}
+
+    def row(doctor_id, day):
+        key = (doctor_id, day)
+        if key not in rows:
+            rows[key] = {'doctor_id': doctor_id, 'date': day, 'booked': 0, 'completed': 0,
+                         'cancelled': 0, 'expired': 0, 'booked_minutes': 0, 'available_minutes': 0}
+        return rows[key]
+
+    hot, archived = Appointment.__table__, ArchivedAppointment.__table__
+    visits = union_all(*[
+        select(t.c.doctor_id, t.c.date, t.c.status).where(t.c.date.in_(days)) for t in (hot, archived)
+    ]).subquery()
+    for doctor_id, day, booked, completed, cancelled, expired in connection.execute(
+        select(visits.c.doctor_id, visits.c.date,
+               func.sum(case((visits.c.status == 'Booked', 1), else_=0)),
+               func.sum(case((visits.c.status == 'Completed', 1), else_=0)),
+               func.sum(case((visits.c.status == 'Cancelled', 1), else_=0)),
+               func.sum(case((visits.c.status == 'Expired', 1), else_=0)))
+        .group_by(visits.c.doctor_id, visits.c.date)
+    ):
+        r = row(doctor_id, day)
+        r.update(booked=booked, completed=completed, cancelled=cancelled, expired=expired,
+                 booked_minutes=(booked + completed + expired) * SLOT_MINUTES)
+
+    availability = DoctorAvailability.__table__
+    for doctor_id, day, start, end in connection.execute(
+        select(availability.c.doctor_id, availability.c.date, availability.c.start_time, availability.c.end_time)
+        .where(availability.c.date.in_(days), availability.c.is_available == True)
+    ):
+        row(doctor_id, day)['available_minutes'] += max(_minutes(start, end), 0)
+
+    connection.execute(delete(stats).where(stats.c.date.in_(days)))
+    if rows:
+        connection.execute(insert(stats), list(rows.values()))
+    return len(rows)
+
+
+def catch_up(chunk_days=CHUNK_DAYS, verbose=False):
+    # Called from @replica_reads views too: the pending days must come from
+    # the primary, where they are cleared, or a lagging replica keeps
+    # returning days that are already done
+    with use_primary():
+        return _catch_up(chunk_days, verbose)
+
+
+def _catch_up(chunk_days, verbose):
+    total = 0
+    while True:
+        days = [d for (d,) in db.session.execute(
+            select(pending.c.date).order_by(pending.c.date).limit(chunk_days))]
+        if not days:
+            break
+        started = time.perf_counter()
+        connection = db.session.connection()
+        # Unmark first: a write committed after this transaction marks the day again
+        connection.execute(delete(pending).where(pending.c.date.in_(days)))
+        written = refresh_days(connection, days)
+        db.session.commit()
+        total += len(days)
+        if verbose:
+            print(f'{days[0]} .. {days[-1]}: {written} rollup rows '
+                  f'({time.perf_counter() - started:.2f}s)')
+    return total
+
+
+def rebuild(verbose=True):
+    connection = db.session.connection()
+    stats.drop(connection, checkfirst=True)
+    stats.create(connection)
+    for model in (Appointment, ArchivedAppointment, DoctorAvailability):
+        table = model.__table__
+        connection.execute(insert(pending).prefix_with('OR IGNORE').from_select(
+            ['date'], select(table.c.date).distinct()))
+    db.session.commit()
+    days = catch_up(verbose=verbose)
+    if verbose:
+        print(f'Rollups rebuilt for {days} days')
+    return days
+
+
+def main():
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    parser = argparse.ArgumentParser(description='Bring the daily utilization rollups up to date.')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every day, not just changed ones')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.rebuild:
+            rebuild()
+        else:
+            print(f'Refreshed {catch_up(verbose=True)} changed days')
+
+
+if __name__ == '__main__':
+    main()
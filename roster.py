@@ -0,0 +1,115 @@
+"""Maintained doctor/patient roster (the doctor_patient table).
+
+Every flush that adds, removes or changes an appointment recomputes the
+roster row of each (doctor, patient) pair it touched, from both the hot and
+the archive tier, inside the same transaction. A single pair only has a
+handful of appointments, so this costs a few index lookups per booking,
+cancellation or treatment update, and the doctor's dashboard reads one
+page of the roster instead of a DISTINCT over all of the doctor's visits.
+
+Writes that bypass the ORM (bulk_import, raw SQL, Query.update) are not
+seen; rebuild() recomputes the whole table:
+
+Usage: python roster.py
+"""
+from sqlalchemy import and_, bindparam, case, delete, event, func, insert, select, union_all, update
+from sqlalchemy.orm import Session
+
+from models import db, Appointment, ArchivedAppointment, DoctorPatient
+
+roster = DoctorPatient.__table__
+
+
+def _visits(*criteria):
+    # (doctor_id, patient_id, date, status) of every appointment in both tiers
+    hot, archived = Appointment.__table__, ArchivedAppointment.__table__
+    return union_all(
+        select(hot.c.doctor_id, hot.c.patient_id, hot.c.date, hot.c.status).where(*[c(hot) for c in criteria]),
+        select(archived.c.doctor_id, archived.c.patient_id, archived.c.date, archived.c.status)
+        .where(*[c(archived) for c in criteria]),
+    ).subquery()
+
+
+def _summary(visits):
+    return (
+        func.min(visits.c.date).label('first_seen'),
+        func.max(visits.c.date).label('last_seen'),
+        func.coalesce(func.sum(case((visits.c.status != 'Cancelled', 1), else_=0)), 0).label('visit_count'),
+    )
+
+
+def refresh_pairs(connection, pairs):
+    for doctor_id, patient_id in pairs:
+        visits = _visits(lambda t: t.c.doctor_id == doctor_id, lambda t: t.c.patient_id == patient_id)
+        first_seen, last_seen, visit_count = connection.execute(select(*_summary(visits))).one()
+        this_pair = and_(roster.c.doctor_id == doctor_id, roster.c.patient_id == patient_id)
+        if first_seen is None:
+            connection.execute(delete(roster).where(this_pair))
+            continue
+        values = {'first_seen': first_seen, 'last_seen': last_seen, 'visit_count': visit_count}
+        if not connection.execute(update(roster).where(this_pair).values(**values)).rowcount:
+            connection.execute(insert(roster).values(doctor_id=doctor_id, patient_id=patient_id, **values))
+
+
+def subtract_visits(connection, counts):
+    # {(doctor_id, patient_id): n} appointments just cancelled in place: the
+    # dates are unchanged, so only the visit counts drop (one executemany)
+    if counts:
+        connection.execute(
+            update(roster).where(roster.c.doctor_id == bindparam('b_doctor_id'),
+                                 roster.c.patient_id == bindparam('b_patient_id'))
+            .values(visit_count=roster.c.visit_count - bindparam('b_cancelled')),
+            [{'b_doctor_id': d, 'b_patient_id': p, 'b_cancelled': n} for (d, p), n in sorted(counts.items())]
+        )
+
+
+def _touched_pairs(session):
+    pairs = set()
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if not isinstance(obj, Appointment):
+            continue
+        pairs.add((obj.doctor_id, obj.patient_id))
+        if obj in session.dirty:
+            # A rescheduled or reassigned appointment also changes the old pair
+            attrs = db.inspect(obj).attrs
+            old_doctor = attrs.doctor_id.history.deleted or [obj.doctor_id]
+            old_patient = attrs.patient_id.history.deleted or [obj.patient_id]
+            pairs.add((old_doctor[0], old_patient[0]))
+    return pairs
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_roster_pairs(session, flush_context, instances):
+    pairs = _touched_pairs(session)
+    if pairs:
+        session.info.setdefault('roster_pairs', set()).update(pairs)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_roster(session, flush_context):
+    pairs = session.info.pop('roster_pairs', None)
+    if pairs:
+        refresh_pairs(session.connection(), sorted(pairs))
+
+
+def rebuild(verbose=True):
+    visits = _visits()
+    connection = db.session.connection()
+    connection.execute(delete(roster))
+    connection.execute(insert(roster).from_select(
+        ['doctor_id', 'patient_id', 'first_seen', 'last_seen', 'visit_count'],
+        select(visits.c.doctor_id, visits.c.patient_id, *_summary(visits))
+        .group_by(visits.c.doctor_id, visits.c.patient_id)
+    ))
+    db.session.commit()
+    if verbose:
+        print(f'Roster rebuilt: {DoctorPatient.query.count()} doctor/patient pairs')
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    with app.app_context():
+        db.create_all()
+        rebuild()
@@ -0,0 +1,120 @@
+"""Full-text search over doctors and patients.
+
+On SQLite builds with FTS5 the doctor and patient text columns are mirrored
+into external-content FTS5 tables kept in sync by triggers, so searches are
+index lookups ranked by bm25 and every word is matched as a prefix
+("card" finds "Cardiology"). Without FTS5 (or on other databases) the
+original ilike('%q%') filters are used instead.
+"""
+import re
+
+from sqlalchemy import event, func, literal_column, or_, table, column
+from sqlalchemy.exc import OperationalError
+
+from models import db, Doctor, Patient
+
+# table -> (columns mirrored into <table>_fts, bm25 weight per column)
+FTS_TABLES = {
+    'doctor': (('name', 'specialization'), (10.0, 5.0)),
+    'patient': (('name', 'email'), (10.0, 2.0)),
+}
+
+_fts_ready = {}
+
+
+def _fts_ddl(name, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join('new.' + c for c in columns)
+    old_values = ', '.join('old.' + c for c in columns)
+    delete_old = (f"INSERT INTO {name}_fts({name}_fts, rowid, {cols}) "
+                  f"VALUES ('delete', old.id, {old_values});")
+    insert_new = f"INSERT INTO {name}_fts(rowid, {cols}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE {name}_fts USING fts5({cols}, content='{name}', "
+        f"content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ai AFTER INSERT ON {name} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ad AFTER DELETE ON {name} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_au AFTER UPDATE OF {cols} ON {name} "
+        f"BEGIN {delete_old} {insert_new} END",
+        # Index whatever rows the table already holds
+        f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    _fts_ready.pop(str(connection.engine.url), None)
+    for name, (columns, _) in FTS_TABLES.items():
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name + '_fts',)
+        ).first()
+        if exists:
+            continue
+        try:
+            for statement in _fts_ddl(name, columns):
+                connection.exec_driver_sql(statement)
+        except OperationalError:
+            # SQLite compiled without FTS5: searches fall back to ilike
+            return
+
+
+# Build the indexes alongside the regular tables on create_all()
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+def fts_enabled():
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _fts_ready:
+        ready = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                found = conn.exec_driver_sql(
+                    "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s)"
+                    % ', '.join('?' * len(FTS_TABLES)),
+                    tuple(name + '_fts' for name in FTS_TABLES)
+                ).scalar()
+            ready = found == len(FTS_TABLES)
+        _fts_ready[key] = ready
+    return _fts_ready[key]
+
+
+def fts_query(search_query):
+    # Each word becomes a quoted prefix term; terms are ANDed together
+    words = re.findall(r'\w+', search_query or '')
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def _fts_search(model, search_query):
+    name = model.__tablename__
+    columns, weights = FTS_TABLES[name]
+    fts = table(name + '_fts', column('rowid'))
+    fts_table = literal_column(name + '_fts')
+    return model.query.join(fts, fts.c.rowid == model.id).filter(
+        fts_table.op('MATCH')(fts_query(search_query))
+    ).order_by(func.bm25(fts_table, *weights))
+
+
+def search_doctors(search_query):
+    if fts_query(search_query) and fts_enabled():
+        return _fts_search(Doctor, search_query)
+    return Doctor.query.filter(
+        or_(
+            Doctor.name.ilike(f'%{search_query}%'),
+            Doctor.specialization.ilike(f'%{search_query}%')
+        )
+    )
+
+
+def search_patients(search_query):
+    if fts_query(search_query) and fts_enabled():
+        return _fts_search(Patient, search_query)
+    return Patient.query.filter(
+        or_(
+            Patient.name.ilike(f'%{search_query}%'),
+            Patient.email.ilike(f'%{search_query}%')
+        )
+    )
@@ -0,0 +1,266 @@
+"""Earliest-free-slot engine.
+
+Keeps a per-doctor, per-day grid of SLOT_MINUTES slots for the next
+WINDOW_DAYS days as NumPy arrays: `open` marks slots inside a published
+DoctorAvailability window and `booked` counts Booked appointments in each
+slot. "Earliest K free slots for department X / specialization Y" is then a
+mask and a flatnonzero over the grid.
+
+Appointment bookings, cancellations and reschedules committed through the
+ORM are applied to the grid incrementally (see the session events at the
+bottom). Availability or doctor edits mark the grid stale, and it is rebuilt
+on the next query, when the day rolls over, or every REBUILD_SECONDS so
+changes made by other worker processes are picked up.
+
+With a shared CACHE_BACKEND the grid also remembers the data versions of
+the tables it was built from (cache.data_version) and is rebuilt as soon
+as any process commits to one of them. With LOCAL_CACHES=0 and no shared
+backend it is rebuilt for every query.
+"""
+import threading
+import time as clock
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import VERSION_PREFIX, cache
+from database import use_primary
+from models import db, Doctor, Appointment, DoctorAvailability
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WINDOW_DAYS = 7
+REBUILD_SECONDS = 60
+
+
+def slot_index(t):
+    return (t.hour * 60 + t.minute) // SLOT_MINUTES
+
+
+def slot_time(index):
+    minutes = int(index) * SLOT_MINUTES
+    return datetime.min.replace(hour=minutes // 60, minute=minutes % 60).time()
+
+
+class SlotEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stale = True
+        self._built_at = 0.0
+        self.start_date = None
+        self.doctor_ids = ()
+        self._row = {}
+        self.max_age = REBUILD_SECONDS
+        self._versions = None
+
+    def init_app(self, app):
+        self.max_age = REBUILD_SECONDS if cache.shared or app.config.get('LOCAL_CACHES', True) else 0
+
+    def invalidate(self):
+        self._stale = True
+
+    def _table_versions(self):
+        if not cache.shared:
+            return None
+        return [cache.data_version(model.__table__.name) for model in (Doctor, DoctorAvailability, Appointment)]
+
+    def _needs_rebuild(self, today, versions):
+        return (self._stale or self.start_date != today or versions != self._versions
+                or clock.monotonic() - self._built_at >= self.max_age)
+
+    def rebuild(self, today=None):
+        # NumPy is only loaded once a process first needs the grid
+        import numpy as np
+
+        today = today or date.today()
+        end = today + timedelta(days=WINDOW_DAYS - 1)
+
+        doctors = Doctor.query.filter(Doctor.is_active == True).order_by(Doctor.id).all()
+        row = {d.id: i for i, d in enumerate(doctors)}
+        open_slots = np.zeros((len(doctors), WINDOW_DAYS, SLOTS_PER_DAY), dtype=bool)
+        booked = np.zeros(open_slots.shape, dtype=np.uint16)
+
+        windows = db.session.query(
+            DoctorAvailability.doctor_id,
+            DoctorAvailability.date,
+            DoctorAvailability.start_time,
+            DoctorAvailability.end_time
+        ).filter(
+            DoctorAvailability.date >= today,
+            DoctorAvailability.date <= end,
+            DoctorAvailability.is_available == True
+        ).all()
+        for doctor_id, day, start_t, end_t in windows:
+            if doctor_id not in row:
+                continue
+            # Only slots that fit entirely inside the window
+            first = -(-(start_t.hour * 60 + start_t.minute) // SLOT_MINUTES)
+            last = (end_t.hour * 60 + end_t.minute) // SLOT_MINUTES
+            open_slots[row[doctor_id], (day - today).days, first:last] = True
+
+        appointments = db.session.query(
+            Appointment.doctor_id, Appointment.date, Appointment.time
+        ).filter(
+            Appointment.date >= today,
+            Appointment.date <= end,
+            Appointment.status == 'Booked'
+        ).all()
+        hits = [(row[d], (day - today).days, slot_index(t))
+                for d, day, t in appointments if d in row]
+        if hits:
+            rows, days, slots = np.array(hits).T
+            np.add.at(booked, (rows, days, slots), 1)
+
+        with self._lock:
+            self.start_date = today
+            self.doctor_ids = np.array([d.id for d in doctors], dtype=np.int64)
+            self.names = np.array([d.name for d in doctors], dtype=object)
+            self.specializations = np.array([d.specialization for d in doctors], dtype=object)
+            self._specializations_lower = np.array(
+                [(d.specialization or '').lower() for d in doctors], dtype=object)
+            self.department_ids = np.array([d.department_id for d in doctors], dtype=np.int64)
+            self._row = row
+            self.open = open_slots
+            self.booked = booked
+            self._stale = False
+            self._built_at = clock.monotonic()
+
+    def _adjust(self, doctor_id, day, t, delta):
+        with self._lock:
+            if self.start_date is None or doctor_id not in self._row:
+                return
+            offset = (day - self.start_date).days
+            if 0 <= offset < WINDOW_DAYS:
+                cell = (self._row[doctor_id], offset, slot_index(t))
+                self.booked[cell] = max(int(self.booked[cell]) + delta, 0)
+
+    def book(self, doctor_id, day, t):
+        self._adjust(doctor_id, day, t, 1)
+
+    def release(self, doctor_id, day, t):
+        self._adjust(doctor_id, day, t, -1)
+
+    def earliest(self, k=5, department_id=None, specialization=None, days=WINDOW_DAYS, now=None):
+        import numpy as np
+
+        now = now or datetime.now()
+        today = now.date()
+        # Read before the rebuild: a commit made meanwhile must trigger the next one
+        versions = self._table_versions()
+        if self._needs_rebuild(today, versions):
+            # The grid is shared and patched by later commits, so build it from the primary
+            with use_primary():
+                self.rebuild(today)
+            self._versions = versions
+
+        days = max(1, min(days, WINDOW_DAYS))
+        with self._lock:
+            doctors = np.ones(len(self.doctor_ids), dtype=bool)
+            if department_id:
+                doctors &= self.department_ids == department_id
+            if specialization:
+                doctors &= self._specializations_lower == specialization.lower()
+
+            free = self.open[doctors, :days] & (self.booked[doctors, :days] == 0)
+            # Slots that have already started today are gone
+            past = np.arange(SLOTS_PER_DAY) * SLOT_MINUTES <= now.hour * 60 + now.minute
+            free[:, 0, past] = False
+
+            # Scan day by day, slot by slot, then doctor, so the first hits
+            # are the earliest slots
+            by_time = free.transpose(1, 2, 0)
+            hits = np.flatnonzero(by_time)[:k]
+            day_idx, slot_idx, doctor_idx = np.unravel_index(hits, by_time.shape)
+
+            rows = np.flatnonzero(doctors)[doctor_idx]
+            return [
+                {
+                    'doctor_id': int(self.doctor_ids[r]),
+                    'doctor_name': self.names[r],
+                    'specialization': self.specializations[r],
+                    'department_id': int(self.department_ids[r]),
+                    'date': self.start_date + timedelta(days=int(d)),
+                    'time': slot_time(s),
+                }
+                for r, d, s in zip(rows, day_idx, slot_idx)
+            ]
+
+
+slot_engine = SlotEngine()
+
+# Any committed write to these tables starts a new data version of it
+for _model in (Doctor, DoctorAvailability, Appointment):
+    cache.invalidate_on_commit([_model], lambda table=_model.__table__.name: [VERSION_PREFIX + table])
+
+
+def _appointment_slot_changes(session):
+    # (+1/-1, doctor_id, date, time) for every Booked slot taken or freed
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Appointment) and obj.status in (None, 'Booked'):
+            changes.append((1, obj.doctor_id, obj.date, obj.time))
+    for obj in session.deleted:
+        if isinstance(obj, Appointment) and obj.status == 'Booked':
+            changes.append((-1, obj.doctor_id, obj.date, obj.time))
+    for obj in session.dirty:
+        if not isinstance(obj, Appointment):
+            continue
+        state = inspect(obj)
+        old = {}
+        changed = False
+        for attr in ('doctor_id', 'date', 'time', 'status'):
+            history = state.attrs[attr].history
+            if history.deleted:
+                old[attr] = history.deleted[0]
+                changed = True
+            else:
+                old[attr] = getattr(obj, attr)
+        if not changed:
+            continue
+        if old['status'] == 'Booked':
+            changes.append((-1, old['doctor_id'], old['date'], old['time']))
+        if obj.status == 'Booked':
+            changes.append((1, obj.doctor_id, obj.date, obj.time))
+    return changes
+
+
+def adjust_after_commit(session, changes):
+    # (+1/-1, doctor_id, date, time) slots to book or release once committed
+    session.info.setdefault('slot_changes', []).extend(changes)
+
+
+def rebuild_after_commit(session):
+    session.info['slot_rebuild'] = True
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_slot_changes(session, flush_context, instances):
+    adjust_after_commit(session, _appointment_slot_changes(session))
+    if any(isinstance(obj, (Doctor, DoctorAvailability))
+           for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        rebuild_after_commit(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_slot_changes(session):
+    if session.info.pop('slot_rebuild', False):
+        slot_engine.invalidate()
+    for delta, doctor_id, day, t in session.info.pop('slot_changes', []):
+        if delta > 0:
+            slot_engine.book(doctor_id, day, t)
+        else:
+            slot_engine.release(doctor_id, day, t)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_slot_changes(session):
+    session.info.pop('slot_changes', None)
+    session.info.pop('slot_rebuild', None)
+
+
+# Query.delete()/update() bypass the flush, so be conservative
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_write(orm_execute_state):
+    if orm_execute_state.is_delete or orm_execute_state.is_update:
+        rebuild_after_commit(orm_execute_state.session)
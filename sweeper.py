@@ -0,0 +1,111 @@
+"""Expire Booked appointments whose day has passed.
+
+Nobody marked them Completed or Cancelled, so they would otherwise stay
+Booked for ever: every "upcoming" query, the partial Booked indexes and
+the slot checks would keep stepping over them. The sweep sets them to
+Expired in chunks of --chunk-size rows, one short transaction per chunk,
+so bookings keep going while it runs and it can be stopped and rerun at
+any time. A doctor or admin can still mark an expired appointment
+Completed or Cancelled afterwards.
+
+The app sweeps once a day in a background thread (ensure_swept); the same
+sweep can be run from cron:
+
+Usage: python sweeper.py [--chunk-size 5000] [--pause 0]
+"""
+import argparse
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import select, update
+
+from models import db, Appointment
+from cache import invalidate_after_commit
+import rollups
+
+EXPIRED = 'Expired'
+
+_swept_on = {}
+_sweep_lock = threading.Lock()
+
+
+def _expire_chunk(connection, today, chunk_size):
+    appointment = Appointment.__table__
+    # The subquery walks the partial index on Booked rows, oldest first
+    stale = select(appointment.c.id).where(
+        appointment.c.status == 'Booked', appointment.c.date < today
+    ).order_by(appointment.c.date, appointment.c.time).limit(chunk_size)
+    return connection.execute(
+        update(appointment).where(appointment.c.id.in_(stale), appointment.c.status == 'Booked')
+        .values(status=EXPIRED).returning(appointment.c.date)
+    ).scalars().all()
+
+
+def sweep(today=None, chunk_size=5000, pause=0.0, verbose=True):
+    today = today or date.today()
+    total = 0
+    started = time.perf_counter()
+    while True:
+        chunk_start = time.perf_counter()
+        days = _expire_chunk(db.session.connection(), today, chunk_size)
+        if days:
+            # Core updates skip the flush events: queue what they would have
+            invalidate_after_commit(db.session, [Appointment])
+            rollups.mark_days(db.session.connection(), days)
+        db.session.commit()
+        if not days:
+            break
+        total += len(days)
+        if verbose:
+            elapsed = time.perf_counter() - chunk_start
+            print(f'{min(days)} .. {max(days)}: {len(days)} expired ({len(days) / elapsed:.0f} rows/s)')
+        if pause:
+            time.sleep(pause)
+    elapsed = time.perf_counter() - started
+    if verbose:
+        print(f'Expired {total} appointments booked before {today} in {elapsed:.1f}s '
+              f'({total / elapsed if elapsed else 0:.0f} rows/s)')
+    return total
+
+
+def ensure_swept(app, today=None):
+    # Called before each request; starts at most one sweep per day per database
+    today = today or date.today()
+    url = app.config['SQLALCHEMY_DATABASE_URI']
+    if _swept_on.get(url) == today:
+        return
+    with _sweep_lock:
+        if _swept_on.get(url) == today:
+            return
+        _swept_on[url] = today
+
+    def run():
+        with app.app_context():
+            try:
+                sweep(today, verbose=False)
+            except Exception:
+                app.logger.exception('appointment sweep failed')
+                _swept_on.pop(url, None)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='appointment-sweeper', daemon=True).start()
+
+
+def main():
+    from app import create_app
+    app = create_app({'BLUEPRINTS': []})
+
+    parser = argparse.ArgumentParser(description='Expire past appointments that are still Booked.')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to wait between chunks')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        sweep(chunk_size=args.chunk_size, pause=args.pause)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py reads the worker count, bind address, preloading and
+shutdown timeouts from the environment, and keeps database connections
+from being shared across forked workers. Any other WSGI server can serve
+wsgi:app too, but must then dispose the engines after forking itself (see
+database.dispose_engines). `python app.py` remains the development server.
+"""
+from app import create_app
+
+app = create_app()